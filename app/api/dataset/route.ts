@@ -30,8 +30,10 @@ export async function GET() {
 
     const frames = (analysis.analysis?.frames || []).map((f: any) => {
       const filename: string | undefined = f.filename
+      // Annotated frames are saved as PNG; frames without boxes are copied as-is
       const pngName = filename ? `${filename.replace(/\.jpg$/i, "")}.png` : undefined
-      const finalUrl = pngName ? `/datasets/temp/images/${pngName}` : (f.imageUrl || "/temp/unknown.jpg")
+      const datasetName = [pngName, filename].find((name) => name && fs.existsSync(path.join(publicImagesDir, name))) ?? pngName
+      const finalUrl = datasetName ? `/datasets/temp/images/${datasetName}` : (f.imageUrl || "/temp/unknown.jpg")
       return { ...f, imageUrl: finalUrl }
     })
 
@@ -50,14 +50,14 @@ async function processVideoWithAI(videoPath: string, jobId: string): Promise<Pro
     const apiKey = process.env.OPENROUTER_API_KEY || ""
     if (!apiKey) {
       console.log("[v0] Warning: No analysis API key found, using fallback analysis")
-      return createMockResults(extractResult.frames || [])
+      return createMockResults(loadExtractedFrames(extractResult))
     }
     
     const analysisResult = await runPythonScript("analyze_frames_openrouter.py", [framesDir, apiKey, jobId])
     
     if (!analysisResult.success) {
       console.log("[v0] AI analysis failed, using extracted frames only:", analysisResult.error)
-      return createMockResults(extractResult.frames || [])
+      return createMockResults(loadExtractedFrames(extractResult))
     }
     
     console.log("[v0] Enhanced analysis completed successfully")
@@ -87,6 +87,8 @@ async function runPythonScript(scriptName: string, args: string[]): Promise<any>
     let output = ""
     let errorOutput = ""
     
+    // Decode as UTF-8 across chunk boundaries; the JSON result may contain non-ASCII text
+    pythonProcess.stdout.setEncoding("utf8")
     pythonProcess.stdout.on("data", (data) => {
       output += data.toString()
     })
@@ -119,6 +121,20 @@ async function runPythonScript(scriptName: string, args: string[]): Promise<any>
 }
 
 // Helper function to create mock results when AI analysis fails
+// Extracted frames are listed in an NDJSON manifest (one frame per line) next to the images
+function loadExtractedFrames(extractResult: any): any[] {
+  if (Array.isArray(extractResult.frames)) {
+    return extractResult.frames
+  }
+  if (!extractResult.manifest || !fs.existsSync(extractResult.manifest)) {
+    return []
+  }
+  return fs.readFileSync(extractResult.manifest, "utf-8")
+    .split("\n")
+    .filter((line) => line.trim())
+    .map((line) => JSON.parse(line))
+}
+
 function createMockResults(frames: any[]): ProcessingResults {
   return {
     incorrectParking: false,
@@ -181,10 +197,11 @@ export async function POST(request: NextRequest, { params }: { params: { id: str
       // Map frames to use public dataset image URLs when available
       const frames = (analysis.analysis?.frames || []).map((f: any) => {
         const filename: string | undefined = f.filename
+        // Annotated frames are saved as PNG; frames without boxes are copied as-is
         const pngName = filename ? `${filename.replace(/\.jpg$/i, "")}.png` : undefined
-        const publicPngPath = pngName ? path.join(publicImagesDir, pngName) : undefined
-        const imageUrl = (pngName && publicPngPath && fs.existsSync(publicPngPath))
-          ? `/datasets/temp/images/${pngName}`
+        const datasetName = [pngName, filename].find((name) => name && fs.existsSync(path.join(publicImagesDir, name)))
+        const imageUrl = datasetName
+          ? `/datasets/temp/images/${datasetName}`
           : (f.imageUrl || "/temp/unknown.jpg")
         return {
           time: f.time,
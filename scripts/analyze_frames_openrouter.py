@@ -1,6 +1,8 @@
 import os
+import re
 import json
 import sys
+import logging
 import base64
 import requests
 import cv2
@@ -8,11 +10,17 @@ import numpy as np
 from pathlib import Path
 import shutil
 import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Redirect all output to stderr except for final JSON result
 original_stdout = sys.stdout
 
+# Per-frame / per-pair diagnostics go through debug logging so they cost nothing unless enabled
+logger = logging.getLogger(__name__)
+
 # Try to import scikit-image, fallback to basic similarity if not available
 try:
     from skimage.metrics import structural_similarity as ssim
@@ -23,7 +31,6 @@ except ImportError:
 
 # Try to import vision detector for object detection
 try:
-    import logging
     # Suppress YOLO startup messages to prevent JSON parsing issues
     os.environ['YOLO_VERBOSE'] = 'False'
     logging.getLogger('ultralytics').setLevel(logging.ERROR)
@@ -44,246 +51,539 @@ except Exception as e:
     print(f"Warning: vision detector import failed with error: {e}, object detection disabled", file=sys.stderr)
     HAS_YOLO = False
 
-def detect_objects_with_yolo(image_path, confidence_threshold=0.10):
+# Optional JIT compilation for the per-detection geometry checks
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        """
+        No-op stand-in for numba.njit when numba isn't installed
+        """
+        def decorator(func):
+            return func
+        return decorator
+
+# Optional CUDA backend for batched frame similarity and FP16 detector inference
+try:
+    import torch
+    import torch.nn.functional as torch_functional
+    HAS_TORCH = True
+    HAS_CUDA = torch.cuda.is_available()
+except ImportError:
+    HAS_TORCH = False
+    HAS_CUDA = False
+
+# Optional faster JSON parsing/serialization for API responses and the dataset cache
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+def json_loads(data):
     """
-    Enhanced YOLO detection with comprehensive object detection
-    Uses multiple models and lower thresholds to catch all objects
+    Parse JSON from str or bytes, using orjson when available
     """
-    if not HAS_YOLO:
-        return []
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json_file(path):
+    """
+    Load a JSON file, reading raw bytes for orjson
+    """
+    if HAS_ORJSON:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_json_file(path, obj):
+    """
+    Write obj as compact UTF-8 JSON, using orjson when available
+    """
+    if HAS_ORJSON:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+
+def print_json_result(obj):
+    """
+    Write the final JSON result to stdout as a single line
+    orjson output is UTF-8 bytes, written to the binary buffer to bypass the console encoding
+    """
+    if HAS_ORJSON:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE))
+        sys.stdout.flush()
+        return
+    print(json.dumps(obj))
+
+# int.bit_count (Python 3.10+) and np.bitwise_count (NumPy 2.0+) map to hardware POPCNT for
+# hash comparisons; older versions fall back to a 16-bit popcount lookup table
+HAS_INT_BIT_COUNT = hasattr(int, "bit_count")
+HAS_NP_BITWISE_COUNT = hasattr(np, "bitwise_count")
+POPCOUNT_16 = np.unpackbits(np.arange(1 << 16, dtype=">u2").view(np.uint8)).reshape(-1, 16).sum(axis=1).astype(np.uint8)
+
+# Class-name lookup tables for safety classification (exact, lowercase COCO names)
+# Multi-word COCO names such as "dining table" are listed explicitly so lookups stay O(1)
+SAFETY_CATEGORIES = {
+    "vehicle": ["car", "truck", "bus", "motorcycle", "bicycle"],
+    "person": ["person"],
+    "equipment": ["chair", "desk", "table", "dining table", "laptop", "monitor", "keyboard"],
+    "container": ["bottle", "cup", "bowl", "box", "suitcase", "handbag", "backpack"],
+    "obstacles": ["bench", "potted plant", "vase", "sports ball"],
+    "waste": ["trash", "recycling", "garbage"],
+    "warning": ["stop sign", "traffic light", "fire hydrant"],
+    "structure": ["door", "window", "wall"]
+}
+CLASS_TO_CATEGORY = {cls: category for category, items in SAFETY_CATEGORIES.items() for cls in items}
+
+VEHICLE_CLASSES = frozenset({"car", "truck", "bus", "motorcycle", "bicycle", "motorbike"})
+ROAD_VEHICLE_CLASSES = frozenset({"car", "truck", "bus"})
+BLOCKING_FURNITURE_CLASSES = frozenset({"table", "dining table", "desk", "cabinet", "shelf", "couch", "wardrobe"})
+LARGE_CONTAINER_CLASSES = frozenset({"box", "container", "barrel", "bin", "crate", "pallet"})
+PATHWAY_EQUIPMENT_CLASSES = frozenset({"ladder", "cart", "trolley", "machine", "forklift"})
+CRITICAL_HAZARD_CLASSES = VEHICLE_CLASSES | BLOCKING_FURNITURE_CLASSES | LARGE_CONTAINER_CLASSES | PATHWAY_EQUIPMENT_CLASSES
+
+# Mitigation grouping for detected classes; anything not listed falls into "other_hazards"
+MITIGATION_CATEGORIES = {
+    "vehicles": ["car", "truck", "bus", "motorcycle", "bicycle"],
+    "people": ["person"],
+    "furniture": ["chair", "table", "dining table", "bench", "desk", "cabinet"],
+    "personal_items": ["bag", "handbag", "suitcase", "backpack", "luggage"],
+    "containers": ["box", "container", "barrel", "bucket"],
+    "trip_hazards": ["bottle", "cup", "ball", "sports ball", "baseball bat", "baseball glove", "book", "phone", "cell phone"],
+    "equipment": ["monitor", "computer", "printer", "machine"]
+}
+CLASS_TO_MITIGATION_CATEGORY = {cls: category for category, items in MITIGATION_CATEGORIES.items() for cls in items}
+
+# Adaptive confidence threshold groups, most sensitive first
+SENSITIVE_THRESHOLD_CLASSES = frozenset({"car", "truck", "forklift", "vehicle", "bicycle"})
+BLOCKING_THRESHOLD_CLASSES = frozenset({"table", "dining table", "desk", "cabinet", "ladder", "cart", "box", "container"})
+SMALL_OBJECT_THRESHOLD_CLASSES = frozenset({"person", "chair", "bag", "handbag", "bottle", "phone", "cell phone"})
+DEFAULT_ADAPTIVE_THRESHOLD = 0.30
+CLASS_TO_ADAPTIVE_THRESHOLD = {
+    **{cls: 0.35 for cls in SMALL_OBJECT_THRESHOLD_CLASSES},
+    **{cls: 0.25 for cls in BLOCKING_THRESHOLD_CLASSES},
+    **{cls: 0.20 for cls in SENSITIVE_THRESHOLD_CLASSES}
+}
+
+# Per-frame detector output kept as columns until the surviving detections are emitted
+DETECTION_DTYPE = np.dtype([
+    ("x", "f8"), ("y", "f8"), ("w", "f8"), ("h", "f8"),
+    ("conf", "f4"), ("cls", "i2"), ("model", "i1")
+])
+
+# Loaded detector models keyed by weight path, shared across frames
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+def _resolve_engine_weights(name, batch_size=16):
+    """
+    Return the path of a TensorRT FP16 engine for the given .pt weights, exporting it on first use
+    Engines are cached per GPU compute capability so rebuilds only happen when hardware changes
+    Returns None when CUDA or TensorRT is unavailable or the export fails
+    """
+    if not name.endswith(".pt") or os.environ.get("YOLO_TENSORRT", "1") == "0":
+        return None
     
     try:
-        detected_objects = []
+        import torch
+        import tensorrt  # noqa: F401 - only checking availability
+        if not torch.cuda.is_available():
+            return None
+        major, minor = torch.cuda.get_device_capability()
+    except Exception:
+        return None
+    
+    engine_path = f"{os.path.splitext(name)[0]}_sm{major}{minor}.engine"
+    if os.path.exists(engine_path):
+        return engine_path
+    
+    try:
+        print(f"Exporting {name} to TensorRT FP16 engine (one-time)...", file=sys.stderr)
+        sys.stdout = sys.stderr
+        try:
+            exported_path = VisionDetector(name).export(format="engine", half=True, dynamic=True, batch=batch_size, imgsz=640)
+        finally:
+            sys.stdout = original_stdout
+        os.replace(exported_path, engine_path)
+        return engine_path
+    except Exception as export_error:
+        print(f"TensorRT export failed for {name}, using PyTorch weights: {export_error}", file=sys.stderr)
+        return None
+
+def _get_model(name):
+    """
+    Return a cached detector for the given weights, loading and warming it up on first use
+    Uses a TensorRT engine in place of the .pt weights when one can be built
+    The cache is module-global, so repeated analyzer calls in one process reuse the model
+    """
+    model = _MODEL_CACHE.get(name)
+    if model is not None:
+        return model
+    
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(name)
+        if model is None:
+            engine_path = _resolve_engine_weights(name)
+            
+            # Temporarily redirect stdout to stderr during model loading
+            sys.stdout = sys.stderr
+            try:
+                model = VisionDetector(engine_path or name, task="detect")
+            finally:
+                sys.stdout = original_stdout
+            
+            # Move weights to the GPU once at load time when available (engines are already bound to it)
+            if engine_path is None:
+                try:
+                    import torch
+                    model.to('cuda' if torch.cuda.is_available() else 'cpu')
+                except Exception as device_error:
+                    print(f"Could not move detector {name} to device: {device_error}", file=sys.stderr)
+            
+            # One dummy forward pass at the extracted frame size builds the predictor and
+            # initializes CUDA/TensorRT so the first real batch doesn't pay for it
+            try:
+                with _inference_context():
+                    model(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False, half=HAS_CUDA)
+            except Exception as warmup_error:
+                print(f"Detector {name} warmup failed: {warmup_error}", file=sys.stderr)
+            
+            _MODEL_CACHE[name] = model
+    return model
+
+def _inference_context():
+    """
+    Context for detector forward passes: inference mode, plus FP16 autocast on CUDA
+    Falls back to a no-op context when torch isn't importable
+    """
+    stack = contextlib.ExitStack()
+    if HAS_TORCH:
+        stack.enter_context(torch.inference_mode())
+        if HAS_CUDA:
+            stack.enter_context(torch.autocast("cuda", dtype=torch.float16))
+    return stack
+
+def _read_frame_batch(batch_paths):
+    """
+    Decode a batch of frames into BGR arrays for the detector
+    In-memory BGR arrays are used as-is; unreadable frames are passed through as paths
+    so the detector reports them as before
+    """
+    images = []
+    for image_path in batch_paths:
+        if isinstance(image_path, np.ndarray):
+            images.append(image_path)
+            continue
+        img = cv2.imread(image_path)
+        images.append(img if img is not None else image_path)
+    return images
+
+def _detect_batch_records(model, batch_images, config, batch_size, model_index, class_names):
+    """
+    Run one detector forward pass over a batch of frames
+    Returns one DETECTION_DTYPE record array per frame, holding its realistic detections
+    """
+    # Run inference with lower confidence and higher IoU threshold for comprehensive detection
+    # verbose=False plus the import-time YOLO_VERBOSE/logger settings keep stdout clean
+    with _inference_context():
+        results = model(
+            batch_images, 
+            conf=config["conf"],      # Low confidence to catch more objects
+            iou=0.7,                  # High IoU to reduce duplicate detections
+            agnostic_nms=True,        # Class-agnostic NMS
+            max_det=100,              # Allow more detections
+            verbose=False,
+            half=HAS_CUDA,            # FP16 weights on tensor-core GPUs
+            batch=batch_size          # Stack frames into a single forward pass
+        )
+    
+    batch_records = []
+    for image, result in zip(batch_images, results):
+        records = np.empty(0, dtype=DETECTION_DTYPE)
+        batch_records.append(records)
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            continue
         
-        # Try multiple detector models for enhanced detection
-        model_configs = [
-            {"model": "yolo11n.pt", "name": "nano", "conf": confidence_threshold},
-            {"model": "yolo11s.pt", "name": "small", "conf": confidence_threshold * 0.8},  # Even lower threshold
-            {"model": "yolo11m.pt", "name": "medium", "conf": confidence_threshold * 0.7}   # Lowest threshold
-        ]
+        # Image size for normalization, read once per frame
+        orig_shape = getattr(result, "orig_shape", None)
+        if orig_shape is not None:
+            height, width = orig_shape[:2]
+        elif isinstance(image, np.ndarray):
+            height, width = image.shape[:2]
+        else:
+            img = cv2.imread(image)
+            if img is None:
+                continue
+            height, width = img.shape[:2]
         
-        all_detections = []
+        # Pull all boxes off the device in one transfer and normalize them together
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float64)
+        confs = boxes.conf.cpu().numpy().tolist()
+        class_ids = boxes.cls.cpu().numpy().astype(int).tolist()
         
-        for config in model_configs:
+        # Convert to normalized x, y, w, h format (0-1)
+        xyxy[:, [0, 2]] /= width
+        xyxy[:, [1, 3]] /= height
+        wh_array = xyxy[:, 2:] - xyxy[:, :2]
+        centers = (xyxy[:, :2] + wh_array / 2).tolist()
+        xy = xyxy[:, :2].tolist()
+        wh = wh_array.tolist()
+        
+        records = np.empty(len(confs), dtype=DETECTION_DTYPE)
+        record_count = 0
+        for (x_norm, y_norm), (w_norm, h_norm), (center_x, center_y), confidence, class_id in zip(xy, wh, centers, confs, class_ids):
+            class_name = class_names[class_id]
+            
+            # Apply enhanced filtering
+            if not _is_realistic_core(w_norm, h_norm, center_x, center_y, confidence,
+                                      class_name in ROAD_VEHICLE_CLASSES, class_name == "person"):
+                continue  # Skip unrealistic detections
+            
+            records[record_count] = (x_norm, y_norm, w_norm, h_norm, confidence, class_id, model_index)
+            record_count += 1
+        batch_records[-1] = records[:record_count]
+    return batch_records
+
+def detect_objects_with_yolo_batch(image_paths, confidence_threshold=0.10, batch_size=16, ensemble=False):
+    """
+    Enhanced YOLO detection over a list of frames
+    Frames are fed to each model in batches so inference runs once per batch
+    By default a single medium model is used; ensemble=True runs nano+small+medium
+    image_paths may mix file paths and in-memory BGR arrays
+    Returns one list of detections per image path
+    """
+    if not HAS_YOLO or not image_paths:
+        return [[] for _ in image_paths]
+    
+    try:
+        if ensemble:
+            # Try multiple detector models for enhanced detection
+            model_configs = [
+                {"model": "yolo11n.pt", "name": "nano", "conf": confidence_threshold},
+                {"model": "yolo11s.pt", "name": "small", "conf": confidence_threshold * 0.8},  # Even lower threshold
+                {"model": "yolo11m.pt", "name": "medium", "conf": confidence_threshold * 0.7}   # Lowest threshold
+            ]
+        else:
+            # Medium model alone covers nano's recall; its NMS already deduplicates
+            model_configs = [
+                {"model": "yolo11m.pt", "name": "medium", "conf": confidence_threshold * 0.7}
+            ]
+        
+        frame_records = [[] for _ in image_paths]
+        class_names_by_model = [None] * len(model_configs)
+        
+        for model_index, config in enumerate(model_configs):
             try:
                 print(f"Running detector {config['name']} with confidence {config['conf']:.2f}...", file=sys.stderr)
-                # Suppress YOLO verbose output during model loading
-                import logging
-                logging.getLogger('ultralytics').setLevel(logging.ERROR)
-                
-                # Temporarily redirect stdout to stderr during model loading
-                sys.stdout = sys.stderr
-                model = VisionDetector(config["model"])
-                sys.stdout = original_stdout
-                
-                # Run inference with lower confidence and higher IoU threshold for comprehensive detection
-                # Temporarily redirect stdout to stderr during inference
-                sys.stdout = sys.stderr
-                results = model(
-                    image_path, 
-                    conf=config["conf"],      # Low confidence to catch more objects
-                    iou=0.7,                  # High IoU to reduce duplicate detections
-                    agnostic_nms=True,        # Class-agnostic NMS
-                    max_det=100,              # Allow more detections
-                    verbose=False
-                )
-                sys.stdout = original_stdout
-                
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            # Get bounding box coordinates (xyxy format)
-                            x1, y1, x2, y2 = box.xyxy[0].tolist()
-                            
-                            # Get confidence and class
-                            confidence = float(box.conf[0])
-                            class_id = int(box.cls[0])
-                            class_name = model.names[class_id]
-                            
-                            # Convert to normalized coordinates (0-1)
-                            img = cv2.imread(image_path)
-                            if img is not None:
-                                height, width = img.shape[:2]
-                                
-                                # Convert to normalized x, y, w, h format
-                                x_norm = x1 / width
-                                y_norm = y1 / height
-                                w_norm = (x2 - x1) / width
-                                h_norm = (y2 - y1) / height
-                                
-                                # Classify object type for safety assessment
-                                safety_category = classify_object_for_safety(class_name)
-                                
-                                bbox_position = {
-                                    "x": x_norm,
-                                    "y": y_norm,
-                                    "w": w_norm,
-                                    "h": h_norm
-                                }
-                                
-                                # Apply enhanced filtering
-                                if not is_realistic_detection(class_name, bbox_position, confidence):
-                                    continue  # Skip unrealistic detections
-                                
-                                detection = {
-                                    "class_name": class_name,
-                                    "confidence": confidence,
-                                    "bbox": bbox_position,
-                                    "safety_category": safety_category,
-                                    "potential_hazard": is_critical_safety_hazard(class_name, confidence, bbox_position),
-                                    "model_used": config["name"],
-                                    "detection_id": f"{class_name}_{x_norm:.3f}_{y_norm:.3f}"
-                                }
-                                all_detections.append(detection)
-                
-                print(f"Detector {config['name']} detected {len([d for d in all_detections if d['model_used'] == config['name']])} objects", file=sys.stderr)
-                
+                model = _get_model(config["model"])
+                class_names = {class_id: name.lower() for class_id, name in model.names.items()}
             except Exception as model_error:
                 print(f"Could not load detector {config['name']}: {model_error}, trying next...", file=sys.stderr)
                 continue
+            class_names_by_model[model_index] = class_names
+            model_detection_count = 0
+            
+            # Decode the next batch on a worker thread while the current one is running inference
+            with ThreadPoolExecutor(max_workers=1) as frame_loader:
+                pending_batch = frame_loader.submit(_read_frame_batch, image_paths[:batch_size])
+                
+                for batch_start in range(0, len(image_paths), batch_size):
+                    batch_images = pending_batch.result()
+                    next_start = batch_start + batch_size
+                    if next_start < len(image_paths):
+                        pending_batch = frame_loader.submit(_read_frame_batch, image_paths[next_start:next_start + batch_size])
+                    
+                    try:
+                        batch_records = _detect_batch_records(model, batch_images, config, batch_size, model_index, class_names)
+                    except Exception as batch_error:
+                        # One bad frame fails the whole batch; rerun it frame by frame so only that frame is lost
+                        print(f"Detector {config['name']} batch at frame {batch_start} failed: {batch_error}, retrying frame by frame", file=sys.stderr)
+                        batch_records = []
+                        for offset, image in enumerate(batch_images):
+                            try:
+                                batch_records.extend(_detect_batch_records(model, [image], config, 1, model_index, class_names))
+                            except Exception as frame_error:
+                                print(f"Detector {config['name']} skipped frame {batch_start + offset}: {frame_error}", file=sys.stderr)
+                                batch_records.append(np.empty(0, dtype=DETECTION_DTYPE))
+                    
+                    for offset, records in enumerate(batch_records):
+                        if len(records):
+                            frame_records[batch_start + offset].append(records)
+                            model_detection_count += len(records)
+            
+            print(f"Detector {config['name']} detected {model_detection_count} objects across {len(image_paths)} frames", file=sys.stderr)
         
-        # Remove duplicate detections using distance-based filtering
-        unique_detections = remove_duplicate_detections(all_detections)
+        model_names = [config["name"] for config in model_configs]
+        all_detections = []
+        for records_list in frame_records:
+            records = np.concatenate(records_list) if records_list else np.empty(0, dtype=DETECTION_DTYPE)
+            
+            centers_x = records["x"] + records["w"] / 2
+            centers_y = records["y"] + records["h"] / 2
+            
+            if ensemble and len(records) > 1:
+                # Remove duplicate detections across models using distance-based filtering
+                class_keys = [class_names_by_model[model_index][class_id] for model_index, class_id in zip(records["model"].tolist(), records["cls"].tolist())]
+                kept_indices = _unique_detection_indices(class_keys, centers_x.tolist(), centers_y.tolist(), records["conf"].tolist())
+                records = records[kept_indices]
+                centers_x = centers_x[kept_indices]
+                centers_y = centers_y[kept_indices]
+            
+            all_detections.append(_records_to_detections(records, centers_x, centers_y, class_names_by_model, model_names))
         
-        print(f"Total detections after deduplication: {len(unique_detections)}", file=sys.stderr)
-        return unique_detections
+        if ensemble:
+            print(f"Total detections after deduplication: {sum(len(d) for d in all_detections)}", file=sys.stderr)
+        return all_detections
         
     except Exception as e:
         print(f"Error in enhanced YOLO detection: {e}", file=sys.stderr)
-        return []
+        return [[] for _ in image_paths]
 
-def remove_duplicate_detections(detections, distance_threshold=0.1):
+def _records_to_detections(records, centers_x, centers_y, class_names_by_model, model_names):
     """
-    Remove duplicate detections based on spatial proximity and class similarity
+    Materialize detection dicts from DETECTION_DTYPE records, once per surviving detection
+    Box centers are passed in as precomputed columns
     """
-    if not detections:
-        return []
-    
-    unique_detections = []
+    detections = []
+    for (x_norm, y_norm, w_norm, h_norm, confidence, class_id, model_index), center_x, center_y in zip(records.tolist(), centers_x.tolist(), centers_y.tolist()):
+        class_name = class_names_by_model[model_index][class_id]
+        bbox_position = {
+            "x": x_norm,
+            "y": y_norm,
+            "w": w_norm,
+            "h": h_norm
+        }
+        detections.append({
+            "class_name": class_name,
+            "confidence": confidence,
+            "bbox": bbox_position,
+            "safety_category": classify_object_for_safety(class_name),
+            "potential_hazard": _is_pathway_hazard(class_name, confidence, center_x, center_y),
+            "model_used": model_names[model_index],
+            "detection_id": f"{class_name}_{x_norm:.3f}_{y_norm:.3f}"
+        })
+    return detections
+
+def detect_objects_with_yolo(image_path, confidence_threshold=0.10, ensemble=False):
+    """
+    Enhanced YOLO detection with comprehensive object detection
+    Uses a low threshold (and optionally multiple models) to catch all objects
+    """
+    return detect_objects_with_yolo_batch([image_path], confidence_threshold, ensemble=ensemble)[0]
+
+def _unique_detection_indices(class_keys, centers_x, centers_y, confidences, distance_threshold=0.1):
+    """
+    Indices (in original order) of detections that survive duplicate removal
+    Centers are bucketed into a grid of distance_threshold cells so each detection
+    is only compared against same-class neighbours in the adjacent cells
+    """
+    # Visit detections from most to least confident so the stronger one of a close pair survives
+    order = sorted(range(len(confidences)), key=confidences.__getitem__, reverse=True)
     
-    for detection in detections:
-        is_duplicate = False
+    grid = {}
+    kept_indices = []
+    for i in order:
+        center_x = centers_x[i]
+        center_y = centers_y[i]
+        cell_x = int(center_x // distance_threshold)
+        cell_y = int(center_y // distance_threshold)
+        class_name = class_keys[i]
         
-        for existing in unique_detections:
-            # Check if same class and close proximity
-            if (detection['class_name'] == existing['class_name']):
-                # Calculate center distance
-                center1 = (detection['bbox']['x'] + detection['bbox']['w']/2, 
-                          detection['bbox']['y'] + detection['bbox']['h']/2)
-                center2 = (existing['bbox']['x'] + existing['bbox']['w']/2,
-                          existing['bbox']['y'] + existing['bbox']['h']/2)
-                
-                distance = ((center1[0] - center2[0])**2 + (center1[1] - center2[1])**2)**0.5
-                
-                if distance < distance_threshold:
-                    # Keep the one with higher confidence
-                    if detection['confidence'] > existing['confidence']:
-                        unique_detections.remove(existing)
-                        unique_detections.append(detection)
-                    is_duplicate = True
+        is_duplicate = False
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_x, other_y in grid.get((class_name, cell_x + dx, cell_y + dy), ()):
+                    if (center_x - other_x) ** 2 + (center_y - other_y) ** 2 < distance_threshold ** 2:
+                        is_duplicate = True
+                        break
+                if is_duplicate:
                     break
+            if is_duplicate:
+                break
         
         if not is_duplicate:
-            unique_detections.append(detection)
+            grid.setdefault((class_name, cell_x, cell_y), []).append((center_x, center_y))
+            kept_indices.append(i)
     
-    return unique_detections
+    return sorted(kept_indices)
 
-def classify_object_for_safety(class_name):
+def remove_duplicate_detections(detections, distance_threshold=0.1):
     """
-    Classify detected objects into safety-relevant categories
+    Remove duplicate detections based on spatial proximity and class similarity
     """
-    safety_categories = {
-        "vehicle": ["car", "truck", "bus", "motorcycle", "bicycle"],
-        "person": ["person"],
-        "equipment": ["chair", "desk", "table", "laptop", "monitor", "keyboard"],
-        "container": ["bottle", "cup", "bowl", "box", "suitcase", "handbag", "backpack"],
-        "obstacles": ["bench", "potted plant", "vase", "sports ball"],
-        "waste": ["trash", "recycling", "garbage"],
-        "warning": ["stop sign", "traffic light", "fire hydrant"],
-        "structure": ["door", "window", "wall"]
-    }
+    if not detections:
+        return []
     
-    class_lower = class_name.lower()
-    for category, items in safety_categories.items():
-        if any(item in class_lower for item in items):
-            return category
+    class_keys = [detection['class_name'] for detection in detections]
+    centers_x = [detection['bbox']['x'] + detection['bbox']['w'] / 2 for detection in detections]
+    centers_y = [detection['bbox']['y'] + detection['bbox']['h'] / 2 for detection in detections]
+    confidences = [detection['confidence'] for detection in detections]
     
-    return "other"
+    # Preserve the original detection order in the output
+    kept_indices = _unique_detection_indices(class_keys, centers_x, centers_y, confidences, distance_threshold)
+    return [detections[i] for i in kept_indices]
+
+def classify_object_for_safety(class_name):
+    """
+    Classify detected objects into safety-relevant categories
+    """
+    return CLASS_TO_CATEGORY.get(class_name.lower(), "other")
 
 def get_adaptive_confidence_threshold(class_name, scene_context="warehouse"):
     """
     Get adaptive confidence threshold based on object type and context
     Higher thresholds for less critical objects, lower for safety-critical ones
     """
-    class_lower = class_name.lower()
-    
-    # Critical safety objects - lower threshold (catch more)
-    if any(item in class_lower for item in ["car", "truck", "forklift", "vehicle", "bicycle"]):
-        return 0.20  # Even more sensitive for vehicles
-    
-    # Blocking furniture/equipment - lower threshold for intensive analysis
-    if any(item in class_lower for item in ["table", "desk", "cabinet", "ladder", "cart", "box", "container"]):
-        return 0.25  # More inclusive
-    
-    # Smaller objects - reduced threshold for comprehensive detection
-    if any(item in class_lower for item in ["person", "chair", "bag", "bottle", "phone"]):
-        return 0.35  # More inclusive
-    
-    # Default threshold - more inclusive
-    return 0.30
+    # Vehicles 0.20, blocking furniture/equipment 0.25, small objects 0.35, everything else 0.30
+    return CLASS_TO_ADAPTIVE_THRESHOLD.get(class_name.lower(), DEFAULT_ADAPTIVE_THRESHOLD)
 
-def is_critical_safety_hazard(class_name, confidence, bbox_position, base_threshold=0.20):
+def _is_pathway_hazard(class_lower, confidence, center_x, center_y, base_threshold=0.20):
     """
-    Enhanced smart filtering with adaptive confidence thresholds
+    Core of is_critical_safety_hazard on a lowercase class name and precomputed box center
     """
-    # Get adaptive threshold for this object type
-    adaptive_threshold = get_adaptive_confidence_threshold(class_name)
-    effective_threshold = max(base_threshold, adaptive_threshold)
-    
-    if confidence < effective_threshold:
+    # Cheapest rejection first: most low-confidence detections stop here
+    if confidence < base_threshold:
         return False
     
-    class_lower = class_name.lower()
-    
-    # Only critical hazards that definitely block pathways
-    critical_hazards = {
-        # Vehicles - always critical in hallways
-        "vehicles": ["car", "truck", "bus", "motorcycle", "bicycle", "motorbike"],
-        
-        # Large furniture blocking pathways
-        "blocking_furniture": ["table", "desk", "cabinet", "shelf", "couch", "wardrobe"],
-        
-        # Large containers/boxes
-        "large_containers": ["box", "container", "barrel", "bin", "crate", "pallet"],
-        
-        # Equipment that shouldn't be in hallways
-        "equipment": ["ladder", "cart", "trolley", "machine", "forklift"]
-    }
+    # Adaptive threshold for this object type
+    if confidence < CLASS_TO_ADAPTIVE_THRESHOLD.get(class_lower, DEFAULT_ADAPTIVE_THRESHOLD):
+        return False
     
-    # Check if object is in a critical category
-    for category, items in critical_hazards.items():
-        if any(item in class_lower for item in items):
-            # Additional check: object should be in pathway area (center region)
-            center_x = bbox_position.get('x', 0) + bbox_position.get('w', 0) / 2
-            center_y = bbox_position.get('y', 0) + bbox_position.get('h', 0) / 2
-            
-            # Focus on center pathway areas (avoid wall/edge detections)
-            if 0.2 <= center_x <= 0.8 and 0.3 <= center_y <= 0.9:
-                return True
+    # Only critical hazards that definitely block pathways: vehicles, large furniture,
+    # large containers and equipment that shouldn't be in hallways
+    if class_lower in CRITICAL_HAZARD_CLASSES:
+        # Additional check: object should be in pathway area (center region)
+        # Focus on center pathway areas (avoid wall/edge detections)
+        if 0.2 <= center_x <= 0.8 and 0.3 <= center_y <= 0.9:
+            return True
     
     return False
 
-def is_realistic_detection(class_name, bbox_position, confidence):
+def is_critical_safety_hazard(class_name, confidence, bbox_position, base_threshold=0.20):
     """
-    Filter out unrealistic detections based on size and position
+    Enhanced smart filtering with adaptive confidence thresholds
+    """
+    center_x = bbox_position.get('x', 0) + bbox_position.get('w', 0) / 2
+    center_y = bbox_position.get('y', 0) + bbox_position.get('h', 0) / 2
+    return _is_pathway_hazard(class_name.lower(), confidence, center_x, center_y, base_threshold)
+
+@njit(cache=True)
+def _is_realistic_core(w, h, center_x, center_y, confidence, road_vehicle_flag, person_flag):
+    """
+    Numeric core of is_realistic_detection, compiled with Numba when available
     """
-    w = bbox_position.get('w', 0)
-    h = bbox_position.get('h', 0)
     area = w * h
     
-    class_lower = class_name.lower()
-    
     # Size constraints (as percentage of image)
     if area < 0.001:  # Too small (less than 0.1% of image)
         return False
@@ -292,20 +592,16 @@ def is_realistic_detection(class_name, bbox_position, confidence):
         return False
     
     # Object-specific size validation
-    if any(vehicle in class_lower for vehicle in ["car", "truck", "bus"]):
+    if road_vehicle_flag:
         # Vehicles should be reasonably sized
         if area < 0.01 or area > 0.4:  # 1% to 40% of image
             return False
     
-    if "person" in class_lower:
+    if person_flag:
         # People should be reasonable size
         if area < 0.005 or area > 0.2:  # 0.5% to 20% of image
             return False
     
-    # Position validation - avoid extreme edges for main objects
-    center_x = bbox_position.get('x', 0) + w / 2
-    center_y = bbox_position.get('y', 0) + h / 2
-    
     # Skip objects at very edges (likely partial/cut-off)
     if center_x < 0.05 or center_x > 0.95 or center_y < 0.05 or center_y > 0.95:
         if confidence < 0.7:  # Only keep high-confidence edge detections
@@ -313,50 +609,282 @@ def is_realistic_detection(class_name, bbox_position, confidence):
     
     return True
 
-def assess_hazard_severity(class_name, confidence, bbox_position):
+def is_realistic_detection(class_name, bbox_position, confidence):
     """
-    Assess the severity of a confirmed hazard based on type, size, and position
+    Filter out unrealistic detections based on size and position
     """
-    class_lower = class_name.lower()
+    w = bbox_position.get('w', 0)
+    h = bbox_position.get('h', 0)
     
-    # Calculate object size
-    object_size = bbox_position.get('w', 0) * bbox_position.get('h', 0)
+    # Position validation - avoid extreme edges for main objects
+    center_x = bbox_position.get('x', 0) + w / 2
+    center_y = bbox_position.get('y', 0) + h / 2
     
+    class_lower = class_name.lower()
+    return _is_realistic_core(w, h, center_x, center_y, confidence,
+                              class_lower in ROAD_VEHICLE_CLASSES, class_lower == "person")
+
+# Severity results indexed by the code returned from _severity_core
+SEVERITY_LEVELS = (
+    {
+        "severity": "critical",
+        "reason": "Vehicle blocking emergency access",
+        "priority": 1,
+        "immediate_action": True
+    },
+    {
+        "severity": "high",
+        "reason": "Large object blocking significant pathway area",
+        "priority": 2,
+        "immediate_action": True
+    },
+    {
+        "severity": "medium",
+        "reason": "Object in main pathway area",
+        "priority": 3,
+        "immediate_action": False
+    },
+    {
+        "severity": "low",
+        "reason": "Minor pathway obstruction",
+        "priority": 4,
+        "immediate_action": False
+    }
+)
+
+@njit(cache=True)
+def _severity_core(object_size, center_x, vehicle_flag):
+    """
+    Numeric core of assess_hazard_severity, returns an index into SEVERITY_LEVELS
+    """
     # Vehicles are always critical
-    if any(v in class_lower for v in ["car", "truck", "bus", "motorcycle", "bicycle"]):
-        return {
-            "severity": "critical",
-            "reason": "Vehicle blocking emergency access",
-            "priority": 1,
-            "immediate_action": True
-        }
+    if vehicle_flag:
+        return 0
     
     # Large objects in pathway
     if object_size > 0.1:  # Large object (>10% of frame)
-        return {
-            "severity": "high",
-            "reason": "Large object blocking significant pathway area",
-            "priority": 2,
-            "immediate_action": True
-        }
+        return 1
     
     # Medium objects in center pathway
-    center_x = bbox_position.get('x', 0) + bbox_position.get('w', 0) / 2
     if 0.3 <= center_x <= 0.7 and object_size > 0.05:
-        return {
-            "severity": "medium",
-            "reason": "Object in main pathway area",
-            "priority": 3,
-            "immediate_action": False
-        }
+        return 2
     
     # Default for confirmed hazards
-    return {
-        "severity": "low",
-        "reason": "Minor pathway obstruction",
-        "priority": 4,
-        "immediate_action": False
-    }
+    return 3
+
+def assess_hazard_severity(class_name, confidence, bbox_position):
+    """
+    Assess the severity of a confirmed hazard based on type, size, and position
+    """
+    # Calculate object size and center
+    object_size = bbox_position.get('w', 0) * bbox_position.get('h', 0)
+    center_x = bbox_position.get('x', 0) + bbox_position.get('w', 0) / 2
+    
+    code = _severity_core(object_size, center_x, class_name.lower() in VEHICLE_CLASSES)
+    return dict(SEVERITY_LEVELS[code])
+
+# Fixed mitigation fields per hazard category; only the description is filled in per call
+VEHICLE_MITIGATION_TEMPLATE = {
+    "type": "vehicle_parking_violation",
+    "severity": "critical",
+    "urgency": "immediate",
+    "description": None,
+    "specific_risks": (
+        "Blocks emergency vehicle access",
+        "Prevents fire brigade movement",
+        "Obstructs evacuation routes",
+        "Creates fire safety violations"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Contact vehicle owners for immediate removal",
+        "IMMEDIATE: Deploy traffic cones to mark violation area",
+        "SHORT-TERM: Install permanent 'No Parking' signage",
+        "SHORT-TERM: Paint red lines on pavement",
+        "LONG-TERM: Install physical barriers (bollards)",
+        "LONG-TERM: Implement automated monitoring system"
+    ),
+    "timeline": "Immediate action required within 30 minutes",
+    "responsible_party": "Security/Facilities Management",
+    "estimated_cost": "Low ($100-500 for signage) to Medium ($2000-5000 for barriers)",
+    "emergency_impact": "Critical - directly blocks emergency vehicle access",
+    "compliance": "Fire safety code violation - immediate remediation required"
+}
+
+FURNITURE_MITIGATION_TEMPLATE = {
+    "type": "furniture_obstruction",
+    "severity": "high",
+    "urgency": "short-term",
+    "description": None,
+    "specific_risks": (
+        "Reduces pathway width below minimum requirements",
+        "Impedes emergency evacuation flow",
+        "Creates bottlenecks during emergencies"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Relocate furniture to designated areas",
+        "SHORT-TERM: Mark minimum pathway widths with tape",
+        "MEDIUM-TERM: Designate specific furniture zones",
+        "LONG-TERM: Implement 5S workplace organization"
+    ),
+    "timeline": "Complete within 24 hours",
+    "responsible_party": "Warehouse Operations/Maintenance",
+    "estimated_cost": "Low ($50-200 for marking materials)",
+    "emergency_impact": "High - significantly impedes evacuation flow"
+}
+
+CONTAINER_MITIGATION_TEMPLATE = {
+    "type": "container_storage_violation",
+    "severity": "medium",
+    "urgency": "short-term",
+    "description": None,
+    "specific_risks": (
+        "Creates pathway obstacles",
+        "Potential for contents to spill",
+        "May fall and cause injuries"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Move containers to designated storage areas",
+        "SHORT-TERM: Secure containers properly",
+        "MEDIUM-TERM: Install proper shelving systems",
+        "LONG-TERM: Implement container management protocols"
+    ),
+    "timeline": "Complete within 2-3 days",
+    "responsible_party": "Warehouse Staff/Supervisors",
+    "estimated_cost": "Medium ($500-2000 for storage solutions)",
+    "emergency_impact": "Medium - creates obstacles but pathways remain navigable"
+}
+
+TRIP_HAZARD_MITIGATION_TEMPLATE = {
+    "type": "trip_hazard_elimination",
+    "severity": "medium",
+    "urgency": "immediate",
+    "description": None,
+    "specific_risks": (
+        "Causes falls and injuries",
+        "Slows emergency evacuation",
+        "Creates liability issues"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Remove or secure loose objects",
+        "IMMEDIATE: Clean up spills and debris",
+        "SHORT-TERM: Install adequate trash receptacles",
+        "MEDIUM-TERM: Implement regular cleaning schedule",
+        "LONG-TERM: Staff training on housekeeping protocols"
+    ),
+    "timeline": "Immediate removal within 1 hour",
+    "responsible_party": "Cleaning/Maintenance Staff",
+    "estimated_cost": "Low ($20-100 for cleaning supplies)",
+    "emergency_impact": "Medium - may cause delays during evacuation"
+}
+
+PERSONAL_ITEMS_MITIGATION_TEMPLATE = {
+    "type": "personal_belongings_management",
+    "severity": "low",
+    "urgency": "short-term",
+    "description": None,
+    "specific_risks": (
+        "Creates pathway clutter",
+        "May contain valuable items (security risk)",
+        "Indicates lack of proper storage protocols"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Relocate to designated personal storage areas",
+        "SHORT-TERM: Install personal lockers if needed",
+        "MEDIUM-TERM: Implement clear desk/area policies",
+        "LONG-TERM: Staff training on personal item management"
+    ),
+    "timeline": "Complete within 1 week",
+    "responsible_party": "HR/Facilities Management",
+    "estimated_cost": "Medium ($200-1000 for storage solutions)",
+    "emergency_impact": "Low - minimal impact on emergency procedures"
+}
+
+PEOPLE_MITIGATION_TEMPLATE = {
+    "type": "personnel_safety_training",
+    "severity": "medium",
+    "urgency": "short-term",
+    "description": None,
+    "specific_risks": (
+        "Personnel may not be aware of emergency procedures",
+        "Potential for panic during emergencies",
+        "May inadvertently block evacuation routes"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Conduct emergency procedure briefing",
+        "SHORT-TERM: Post emergency evacuation maps",
+        "MEDIUM-TERM: Conduct emergency evacuation drills",
+        "LONG-TERM: Implement regular safety training program"
+    ),
+    "timeline": "Initial briefing within 24 hours, full training within 1 month",
+    "responsible_party": "Safety Officer/HR Department",
+    "estimated_cost": "Low ($100-500 for training materials)",
+    "emergency_impact": "Variable - depends on personnel emergency preparedness"
+}
+
+AI_PARKING_MITIGATION_TEMPLATE = {
+    "type": "ai_detected_parking_violation",
+    "severity": "critical",
+    "urgency": "immediate",
+    "description": "AI visual analysis detected parking violations affecting emergency access",
+    "specific_risks": (
+        "Confirmed visual obstruction of emergency routes",
+        "Fire code compliance violation",
+        "Insurance liability issues"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Document violation with photos",
+        "IMMEDIATE: Contact vehicle owners",
+        "SHORT-TERM: Install physical barriers",
+        "LONG-TERM: Implement automated monitoring"
+    ),
+    "timeline": "Immediate action required",
+    "responsible_party": "Security/Management",
+    "estimated_cost": "Medium ($1000-3000 for comprehensive solution)",
+    "emergency_impact": "Critical - confirmed emergency access obstruction"
+}
+
+AI_WASTE_MITIGATION_TEMPLATE = {
+    "type": "ai_detected_waste_debris",
+    "severity": "medium",
+    "urgency": "immediate",
+    "description": "AI visual analysis detected waste or debris in pathways",
+    "specific_risks": (
+        "Confirmed pathway obstruction",
+        "Slip and trip hazards",
+        "Fire fuel load concerns"
+    ),
+    "mitigation_steps": (
+        "IMMEDIATE: Remove waste and debris",
+        "SHORT-TERM: Increase cleaning frequency",
+        "MEDIUM-TERM: Install additional waste receptacles",
+        "LONG-TERM: Implement waste management protocols"
+    ),
+    "timeline": "Complete cleaning within 2 hours",
+    "responsible_party": "Cleaning/Maintenance Staff",
+    "estimated_cost": "Low ($50-200 for enhanced cleaning)",
+    "emergency_impact": "Medium - creates evacuation hazards"
+}
+
+PREVENTIVE_MITIGATION_TEMPLATE = {
+    "type": "preventive_maintenance",
+    "severity": "low",
+    "urgency": "long-term",
+    "description": "No immediate hazards detected - implement preventive measures",
+    "specific_risks": (
+        "Future hazard development",
+        "Gradual safety standard degradation"
+    ),
+    "mitigation_steps": (
+        "ONGOING: Maintain regular safety inspections",
+        "MONTHLY: Review and update safety protocols",
+        "QUARTERLY: Conduct comprehensive safety audits",
+        "ANNUALLY: Update emergency response procedures"
+    ),
+    "timeline": "Ongoing preventive program",
+    "responsible_party": "Safety Committee",
+    "estimated_cost": "Low ($100-300 monthly for ongoing programs)",
+    "emergency_impact": "Preventive - maintains safety standards"
+}
 
 def generate_mitigation_strategies(detected_objects, ai_analysis):
     """
@@ -376,254 +904,53 @@ def generate_mitigation_strategies(detected_objects, ai_analysis):
         "other_hazards": []
     }
     
-    # Categorize all detected objects
+    # Categorize all detected objects with a single lookup per object
     for obj in detected_objects:
         if obj.get("potential_hazard", False):
-            category = obj.get("safety_category", "other")
-            class_name = obj.get("class_name", "unknown")
-            
-            if category == "vehicle" or any(v in class_name.lower() for v in ["car", "truck", "bus", "motorcycle", "bicycle"]):
-                object_categories["vehicles"].append(obj)
-            elif category == "person" or "person" in class_name.lower():
-                object_categories["people"].append(obj)
-            elif any(f in class_name.lower() for f in ["chair", "table", "bench", "desk", "cabinet"]):
-                object_categories["furniture"].append(obj)
-            elif any(p in class_name.lower() for p in ["bag", "suitcase", "backpack", "luggage"]):
-                object_categories["personal_items"].append(obj)
-            elif any(c in class_name.lower() for c in ["box", "container", "barrel", "bucket"]):
-                object_categories["containers"].append(obj)
-            elif any(t in class_name.lower() for t in ["bottle", "cup", "ball", "book", "phone"]):
-                object_categories["trip_hazards"].append(obj)
-            elif any(e in class_name.lower() for e in ["monitor", "computer", "printer", "machine"]):
-                object_categories["equipment"].append(obj)
-            else:
-                object_categories["other_hazards"].append(obj)
+            category = CLASS_TO_MITIGATION_CATEGORY.get(obj.get("class_name", "unknown"), "other_hazards")
+            object_categories[category].append(obj)
     
     # Generate specific mitigation strategies for each category
     
     # VEHICLES - Critical Priority
     if object_categories["vehicles"]:
         vehicle_details = [f"{obj['class_name']} (conf: {obj['confidence']:.2f})" for obj in object_categories["vehicles"]]
-        mitigations.append({
-            "type": "vehicle_parking_violation",
-            "severity": "critical",
-            "urgency": "immediate",
-            "description": f"Detected {len(object_categories['vehicles'])} vehicle(s): {', '.join(vehicle_details)}",
-            "specific_risks": [
-                "Blocks emergency vehicle access",
-                "Prevents fire brigade movement",
-                "Obstructs evacuation routes",
-                "Creates fire safety violations"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Contact vehicle owners for immediate removal",
-                "IMMEDIATE: Deploy traffic cones to mark violation area",
-                "SHORT-TERM: Install permanent 'No Parking' signage",
-                "SHORT-TERM: Paint red lines on pavement",
-                "LONG-TERM: Install physical barriers (bollards)",
-                "LONG-TERM: Implement automated monitoring system"
-            ],
-            "timeline": "Immediate action required within 30 minutes",
-            "responsible_party": "Security/Facilities Management",
-            "estimated_cost": "Low ($100-500 for signage) to Medium ($2000-5000 for barriers)",
-            "emergency_impact": "Critical - directly blocks emergency vehicle access",
-            "compliance": "Fire safety code violation - immediate remediation required"
-        })
+        mitigations.append({**VEHICLE_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['vehicles'])} vehicle(s): {', '.join(vehicle_details)}"})
     
     # FURNITURE - High Priority
     if object_categories["furniture"]:
         furniture_details = [f"{obj['class_name']} (conf: {obj['confidence']:.2f})" for obj in object_categories["furniture"]]
-        mitigations.append({
-            "type": "furniture_obstruction",
-            "severity": "high",
-            "urgency": "short-term",
-            "description": f"Detected {len(object_categories['furniture'])} furniture item(s): {', '.join(furniture_details)}",
-            "specific_risks": [
-                "Reduces pathway width below minimum requirements",
-                "Impedes emergency evacuation flow",
-                "Creates bottlenecks during emergencies"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Relocate furniture to designated areas",
-                "SHORT-TERM: Mark minimum pathway widths with tape",
-                "MEDIUM-TERM: Designate specific furniture zones",
-                "LONG-TERM: Implement 5S workplace organization"
-            ],
-            "timeline": "Complete within 24 hours",
-            "responsible_party": "Warehouse Operations/Maintenance",
-            "estimated_cost": "Low ($50-200 for marking materials)",
-            "emergency_impact": "High - significantly impedes evacuation flow"
-        })
+        mitigations.append({**FURNITURE_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['furniture'])} furniture item(s): {', '.join(furniture_details)}"})
     
     # CONTAINERS AND BOXES - Medium Priority
     if object_categories["containers"]:
         container_details = [f"{obj['class_name']} (conf: {obj['confidence']:.2f})" for obj in object_categories["containers"]]
-        mitigations.append({
-            "type": "container_storage_violation",
-            "severity": "medium",
-            "urgency": "short-term",
-            "description": f"Detected {len(object_categories['containers'])} container(s): {', '.join(container_details)}",
-            "specific_risks": [
-                "Creates pathway obstacles",
-                "Potential for contents to spill",
-                "May fall and cause injuries"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Move containers to designated storage areas",
-                "SHORT-TERM: Secure containers properly",
-                "MEDIUM-TERM: Install proper shelving systems",
-                "LONG-TERM: Implement container management protocols"
-            ],
-            "timeline": "Complete within 2-3 days",
-            "responsible_party": "Warehouse Staff/Supervisors",
-            "estimated_cost": "Medium ($500-2000 for storage solutions)",
-            "emergency_impact": "Medium - creates obstacles but pathways remain navigable"
-        })
+        mitigations.append({**CONTAINER_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['containers'])} container(s): {', '.join(container_details)}"})
     
     # TRIP HAZARDS - Medium Priority
     if object_categories["trip_hazards"]:
         trip_details = [f"{obj['class_name']} (conf: {obj['confidence']:.2f})" for obj in object_categories["trip_hazards"]]
-        mitigations.append({
-            "type": "trip_hazard_elimination",
-            "severity": "medium",
-            "urgency": "immediate",
-            "description": f"Detected {len(object_categories['trip_hazards'])} trip hazard(s): {', '.join(trip_details)}",
-            "specific_risks": [
-                "Causes falls and injuries",
-                "Slows emergency evacuation",
-                "Creates liability issues"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Remove or secure loose objects",
-                "IMMEDIATE: Clean up spills and debris",
-                "SHORT-TERM: Install adequate trash receptacles",
-                "MEDIUM-TERM: Implement regular cleaning schedule",
-                "LONG-TERM: Staff training on housekeeping protocols"
-            ],
-            "timeline": "Immediate removal within 1 hour",
-            "responsible_party": "Cleaning/Maintenance Staff",
-            "estimated_cost": "Low ($20-100 for cleaning supplies)",
-            "emergency_impact": "Medium - may cause delays during evacuation"
-        })
+        mitigations.append({**TRIP_HAZARD_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['trip_hazards'])} trip hazard(s): {', '.join(trip_details)}"})
     
     # PERSONAL ITEMS - Low Priority but Important
     if object_categories["personal_items"]:
         personal_details = [f"{obj['class_name']} (conf: {obj['confidence']:.2f})" for obj in object_categories["personal_items"]]
-        mitigations.append({
-            "type": "personal_belongings_management",
-            "severity": "low",
-            "urgency": "short-term",
-            "description": f"Detected {len(object_categories['personal_items'])} personal item(s): {', '.join(personal_details)}",
-            "specific_risks": [
-                "Creates pathway clutter",
-                "May contain valuable items (security risk)",
-                "Indicates lack of proper storage protocols"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Relocate to designated personal storage areas",
-                "SHORT-TERM: Install personal lockers if needed",
-                "MEDIUM-TERM: Implement clear desk/area policies",
-                "LONG-TERM: Staff training on personal item management"
-            ],
-            "timeline": "Complete within 1 week",
-            "responsible_party": "HR/Facilities Management",
-            "estimated_cost": "Medium ($200-1000 for storage solutions)",
-            "emergency_impact": "Low - minimal impact on emergency procedures"
-        })
+        mitigations.append({**PERSONAL_ITEMS_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['personal_items'])} personal item(s): {', '.join(personal_details)}"})
     
     # PEOPLE - Training and Awareness
     if object_categories["people"]:
-        mitigations.append({
-            "type": "personnel_safety_training",
-            "severity": "medium",
-            "urgency": "short-term",
-            "description": f"Detected {len(object_categories['people'])} person(s) in area",
-            "specific_risks": [
-                "Personnel may not be aware of emergency procedures",
-                "Potential for panic during emergencies",
-                "May inadvertently block evacuation routes"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Conduct emergency procedure briefing",
-                "SHORT-TERM: Post emergency evacuation maps",
-                "MEDIUM-TERM: Conduct emergency evacuation drills",
-                "LONG-TERM: Implement regular safety training program"
-            ],
-            "timeline": "Initial briefing within 24 hours, full training within 1 month",
-            "responsible_party": "Safety Officer/HR Department",
-            "estimated_cost": "Low ($100-500 for training materials)",
-            "emergency_impact": "Variable - depends on personnel emergency preparedness"
-        })
+        mitigations.append({**PEOPLE_MITIGATION_TEMPLATE, "description": f"Detected {len(object_categories['people'])} person(s) in area"})
     
     # Add AI-specific mitigations with enhanced detail
     if ai_analysis.get("incorrectParking"):
-        mitigations.append({
-            "type": "ai_detected_parking_violation",
-            "severity": "critical",
-            "urgency": "immediate",
-            "description": "AI visual analysis detected parking violations affecting emergency access",
-            "specific_risks": [
-                "Confirmed visual obstruction of emergency routes",
-                "Fire code compliance violation",
-                "Insurance liability issues"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Document violation with photos",
-                "IMMEDIATE: Contact vehicle owners",
-                "SHORT-TERM: Install physical barriers",
-                "LONG-TERM: Implement automated monitoring"
-            ],
-            "timeline": "Immediate action required",
-            "responsible_party": "Security/Management",
-            "estimated_cost": "Medium ($1000-3000 for comprehensive solution)",
-            "emergency_impact": "Critical - confirmed emergency access obstruction"
-        })
+        mitigations.append(dict(AI_PARKING_MITIGATION_TEMPLATE))
     
     if ai_analysis.get("wasteMaterial"):
-        mitigations.append({
-            "type": "ai_detected_waste_debris",
-            "severity": "medium",
-            "urgency": "immediate",
-            "description": "AI visual analysis detected waste or debris in pathways",
-            "specific_risks": [
-                "Confirmed pathway obstruction",
-                "Slip and trip hazards",
-                "Fire fuel load concerns"
-            ],
-            "mitigation_steps": [
-                "IMMEDIATE: Remove waste and debris",
-                "SHORT-TERM: Increase cleaning frequency",
-                "MEDIUM-TERM: Install additional waste receptacles",
-                "LONG-TERM: Implement waste management protocols"
-            ],
-            "timeline": "Complete cleaning within 2 hours",
-            "responsible_party": "Cleaning/Maintenance Staff",
-            "estimated_cost": "Low ($50-200 for enhanced cleaning)",
-            "emergency_impact": "Medium - creates evacuation hazards"
-        })
+        mitigations.append(dict(AI_WASTE_MITIGATION_TEMPLATE))
     
     # Add overall assessment if no specific hazards found
     if not any(object_categories.values()) and not ai_analysis.get("incorrectParking") and not ai_analysis.get("wasteMaterial"):
-        mitigations.append({
-            "type": "preventive_maintenance",
-            "severity": "low",
-            "urgency": "long-term",
-            "description": "No immediate hazards detected - implement preventive measures",
-            "specific_risks": [
-                "Future hazard development",
-                "Gradual safety standard degradation"
-            ],
-            "mitigation_steps": [
-                "ONGOING: Maintain regular safety inspections",
-                "MONTHLY: Review and update safety protocols",
-                "QUARTERLY: Conduct comprehensive safety audits",
-                "ANNUALLY: Update emergency response procedures"
-            ],
-            "timeline": "Ongoing preventive program",
-            "responsible_party": "Safety Committee",
-            "estimated_cost": "Low ($100-300 monthly for ongoing programs)",
-            "emergency_impact": "Preventive - maintains safety standards"
-        })
+        mitigations.append(dict(PREVENTIVE_MITIGATION_TEMPLATE))
     
     return mitigations
 
@@ -643,24 +970,74 @@ def calculate_basic_similarity(img1, img2):
     except Exception:
         return 0.0
 
+def read_gray_downscaled(image_path, target_size=(160, 120)):
+    """
+    Read an image as grayscale at target_size
+    JPEGs are decoded directly at 1/4 resolution by libjpeg, skipping most of the IDCT work;
+    for 640x480 frames that already yields 160x120 and no resize is needed
+    In-memory BGR arrays skip the decode and are converted directly
+    """
+    if isinstance(image_path, np.ndarray):
+        img = cv2.cvtColor(image_path, cv2.COLOR_BGR2GRAY) if image_path.ndim == 3 else image_path
+    else:
+        img = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None:
+        return None
+    if (img.shape[1], img.shape[0]) != target_size:
+        # Area averaging when shrinking other frame sizes; avoids aliasing in the similarity inputs
+        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+    return img
+
+def normalized_cross_correlation(img1, img2):
+    """
+    Zero-mean normalized cross-correlation of two same-size images
+    Equivalent to cv2.matchTemplate(TM_CCOEFF_NORMED) without building the 1x1 response map
+    """
+    a = img1.astype(np.float64).ravel()
+    b = img2.astype(np.float64).ravel()
+    a -= a.mean()
+    b -= b.mean()
+    denominator = np.sqrt(np.dot(a, a) * np.dot(b, b))
+    if denominator == 0:
+        # A flat image has no structure to correlate; only identical frames count as a match
+        return 1.0 if np.array_equal(img1, img2) else 0.0
+    return float(np.dot(a, b) / denominator)
+
 def calculate_image_similarity(img1_path, img2_path, threshold=0.80):
     """
     Calculate similarity between two images using multiple methods for better detection
     Returns True if images are similar (above threshold)
     """
+    # Read images at a standard small size for comparison (smaller for speed)
+    img1_resized = read_gray_downscaled(img1_path)
+    img2_resized = read_gray_downscaled(img2_path)
+    
+    if img1_resized is None or img2_resized is None:
+        return False
+    
+    return calculate_image_similarity_arr(img1_resized, img2_resized, threshold)
+
+def calculate_image_similarity_arr(img1_resized, img2_resized, threshold=0.80):
+    """
+    Same as calculate_image_similarity, on already decoded same-size grayscale arrays
+    Lets callers decode each frame once and reuse it across comparisons
+    """
     try:
-        # Read images
-        img1 = cv2.imread(img1_path, cv2.IMREAD_GRAYSCALE)
-        img2 = cv2.imread(img2_path, cv2.IMREAD_GRAYSCALE)
+        # Coarse-to-fine: a 32x32 correlation settles clearly similar pairs, and clearly
+        # different ones when the cheap histogram check agrees, before the full-size pass
+        coarse1 = cv2.resize(img1_resized, (32, 32), interpolation=cv2.INTER_AREA)
+        coarse2 = cv2.resize(img2_resized, (32, 32), interpolation=cv2.INTER_AREA)
+        coarse_score = normalized_cross_correlation(coarse1, coarse2)
+        if coarse_score > threshold + 0.1:
+            logger.debug("Coarse similarity %.3f clearly above threshold %.3f", coarse_score, threshold)
+            return True
         
-        if img1 is None or img2 is None:
+        # Use histogram comparison as additional check
+        hist_score = calculate_basic_similarity(img1_resized, img2_resized)
+        if coarse_score < threshold - 0.1 and hist_score <= threshold:
+            logger.debug("Coarse similarity %.3f clearly below threshold %.3f", coarse_score, threshold)
             return False
         
-        # Resize to standard size for comparison (smaller for speed)
-        target_size = (160, 120)  # Smaller size for faster comparison
-        img1_resized = cv2.resize(img1, target_size)
-        img2_resized = cv2.resize(img2, target_size)
-        
         similarity_scores = []
         
         if HAS_SCIKIT_IMAGE:
@@ -668,22 +1045,16 @@ def calculate_image_similarity(img1_path, img2_path, threshold=0.80):
             ssim_score = ssim(img1_resized, img2_resized)
             similarity_scores.append(ssim_score)
         
-        # Use histogram comparison as additional check
-        hist_score = calculate_basic_similarity(img1_resized, img2_resized)
         similarity_scores.append(hist_score)
         
-        # Use template matching as another check
-        try:
-            result = cv2.matchTemplate(img1_resized, img2_resized, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            similarity_scores.append(max_val)
-        except:
-            pass
+        # Use whole-image normalized cross-correlation as another check
+        if img1_resized.shape == img2_resized.shape:
+            similarity_scores.append(normalized_cross_correlation(img1_resized, img2_resized))
         
         # Use the maximum similarity score from all methods
         if similarity_scores:
             max_similarity = max(similarity_scores)
-            print(f"Similarity scores: {[f'{s:.3f}' for s in similarity_scores]}, max: {max_similarity:.3f}, threshold: {threshold:.3f}", file=sys.stderr)
+            logger.debug("Similarity scores: %s, max: %.3f, threshold: %.3f", similarity_scores, max_similarity, threshold)
             return max_similarity > threshold
         
         return False
@@ -692,78 +1063,248 @@ def calculate_image_similarity(img1_path, img2_path, threshold=0.80):
         print(f"Error calculating similarity: {e}", file=sys.stderr)
         return False
 
-def convert_grid_cells_to_bounding_box(grid_cells_string):
+def load_gray_frames(image_paths, target_size=(160, 120)):
     """
-    Convert grid cell notation (e.g., "A1", "B2-B3", "A1-A2-B1-B2") to normalized bounding box coordinates
-    Grid is 4x3: A1-A4 (top), B1-B4 (middle), C1-C4 (bottom)
+    Decode every frame (path or in-memory BGR array) once into a single (N, H, W) uint8 grayscale stack
+    Returns the stack and a boolean mask of frames that could be read
     """
+    frames = np.zeros((len(image_paths), target_size[1], target_size[0]), dtype=np.uint8)
+    valid = np.zeros(len(image_paths), dtype=bool)
+    
+    # JPEG decode releases the GIL, so a few threads decode frames in parallel
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as decoder:
+        images = decoder.map(lambda path: read_gray_downscaled(path, target_size), image_paths)
+        for idx, img in enumerate(images):
+            if img is not None:
+                frames[idx] = img
+                valid[idx] = True
+    return frames, valid
+
+def compute_frame_hashes(gray_frames):
+    """
+    Compute a 64-bit difference hash (dHash) for every frame in one vectorized pass
+    Returns an (N,) uint64 array, one hash per frame
+    """
+    smalls = np.stack([cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA) for img in gray_frames])
+    
+    # Each bit records whether a pixel is brighter than its left neighbour
+    bits = smalls[:, :, 1:] > smalls[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(gray_frames), -1), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+def hamming_distance(hash1, hash2):
+    """
+    Number of differing bits between two 64-bit hashes (XOR + popcount)
+    """
+    diff = int(hash1) ^ int(hash2)
+    if HAS_INT_BIT_COUNT:
+        return diff.bit_count()
+    return int(POPCOUNT_16[diff & 0xFFFF]) + int(POPCOUNT_16[(diff >> 16) & 0xFFFF]) + \
+        int(POPCOUNT_16[(diff >> 32) & 0xFFFF]) + int(POPCOUNT_16[diff >> 48])
+
+def popcount64(values):
+    """
+    Per-element popcount of a uint64 array
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if HAS_NP_BITWISE_COUNT:
+        return np.bitwise_count(values)
+    return POPCOUNT_16[values.view(np.uint16)].reshape(values.shape + (4,)).sum(axis=-1, dtype=np.uint8)
+
+def hamming_distance_matrix(hashes):
+    """
+    All-pairs Hamming distances between 64-bit hashes as one XOR broadcast + popcount
+    Returns an (N, N) uint8 array
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    return popcount64(np.bitwise_xor(hashes[:, None], hashes[None, :])).astype(np.uint8)
+
+def _correlation_matrix(rows):
+    """
+    Pearson correlation between every pair of rows, computed as a single matmul
+    """
+    rows = rows - rows.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    rows = rows / np.maximum(norms, 1e-12)
+    return rows @ rows.T
+
+def compute_similarity_matrix(gray_frames):
+    """
+    Compute the all-pairs correlation similarity for a stack of grayscale frames on the CPU
+    Each entry is the max of histogram correlation (HISTCMP_CORREL) and normalized
+    cross-correlation (TM_CCOEFF_NORMED on same-size frames), both as batched matmuls
+    SSIM is left out since it has no cheap all-pairs form on the CPU
+    """
+    n = len(gray_frames)
+    flat = gray_frames.reshape(n, -1)
+    
+    # Per-frame 256-bin histograms in one bincount by offsetting each frame's values
+    offsets = (np.arange(n) * 256)[:, None]
+    hist = np.bincount((flat + offsets).ravel(), minlength=n * 256).reshape(n, 256).astype(np.float64)
+    
+    hist_scores = _correlation_matrix(hist)
+    ncc_scores = _correlation_matrix(flat.astype(np.float32))
+    return np.maximum(hist_scores, ncc_scores)
+
+def compute_similarity_matrix_gpu(gray_frames):
+    """
+    Compute the all-pairs similarity matrix for a stack of grayscale frames on the GPU
+    Mirrors calculate_image_similarity: each entry is the max of SSIM (7x7 window,
+    sample covariance), histogram correlation and normalized cross-correlation
+    Returns an (N, N) numpy array, or None if CUDA is unavailable
+    """
+    if not HAS_CUDA or len(gray_frames) == 0:
+        return None
+    
     try:
-        if not grid_cells_string or grid_cells_string.strip() == "":
-            return {"x": 0.1, "y": 0.1, "w": 0.2, "h": 0.2}  # Default small box
-        
-        # Parse grid cells
-        cells = [cell.strip() for cell in grid_cells_string.replace("-", ",").split(",")]
-        if not cells:
-            return {"x": 0.1, "y": 0.1, "w": 0.2, "h": 0.2}
-        
-        # Grid layout: 4 columns, 3 rows
-        # A1-A4: row 0, cols 0-3
-        # B1-B4: row 1, cols 0-3  
-        # C1-C4: row 2, cols 0-3
-        grid_positions = []
+        # Single (N, 1, H, W) upload; float32 keeps the SSIM variance terms accurate
+        frames = torch.from_numpy(gray_frames).to('cuda', torch.float32).unsqueeze(1)
+        n = frames.shape[0]
         
-        for cell in cells:
-            cell = cell.upper().strip()
-            if len(cell) >= 2:
-                row_letter = cell[0]
-                col_number = cell[1:]
-                
-                try:
-                    col_index = int(col_number) - 1  # Convert 1-4 to 0-3
-                    if row_letter == 'A':
-                        row_index = 0
-                    elif row_letter == 'B':
-                        row_index = 1
-                    elif row_letter == 'C':
-                        row_index = 2
-                    else:
-                        continue
-                    
-                    if 0 <= col_index <= 3 and 0 <= row_index <= 2:
-                        grid_positions.append((row_index, col_index))
-                except ValueError:
-                    continue
-        
-        if not grid_positions:
-            return {"x": 0.1, "y": 0.1, "w": 0.2, "h": 0.2}
-        
-        # Calculate bounding box from grid positions
-        min_row = min(pos[0] for pos in grid_positions)
-        max_row = max(pos[0] for pos in grid_positions)
-        min_col = min(pos[1] for pos in grid_positions)
-        max_col = max(pos[1] for pos in grid_positions)
-        
-        # Convert to normalized coordinates (0-1)
-        # Each cell is 1/4 width, 1/3 height
-        cell_width = 1.0 / 4.0
-        cell_height = 1.0 / 3.0
-        
-        x = min_col * cell_width
-        y = min_row * cell_height
-        w = (max_col - min_col + 1) * cell_width
-        h = (max_row - min_row + 1) * cell_height
-        
-        # Ensure values are within bounds
-        x = max(0.0, min(1.0, x))
-        y = max(0.0, min(1.0, y))
-        w = max(0.05, min(1.0 - x, w))  # Minimum 5% width
-        h = max(0.05, min(1.0 - y, h))  # Minimum 5% height
+        with torch.inference_mode():
+            # Histogram correlation: per-frame 256-bin histograms, Pearson correlation as a matmul
+            hist = torch.zeros((n, 256), device=frames.device)
+            hist.scatter_add_(1, frames.view(n, -1).long(), torch.ones_like(frames.view(n, -1)))
+            hist = hist - hist.mean(dim=1, keepdim=True)
+            hist = hist / hist.norm(dim=1, keepdim=True).clamp_min(1e-12)
+            hist_scores = hist @ hist.T
+            
+            # Normalized cross-correlation (TM_CCOEFF_NORMED on same-size frames) as a matmul
+            flat = frames.view(n, -1)
+            flat = flat - flat.mean(dim=1, keepdim=True)
+            flat = flat / flat.norm(dim=1, keepdim=True).clamp_min(1e-12)
+            ncc_scores = flat @ flat.T
+            
+            # SSIM with the same defaults as skimage (uniform 7x7 window, data range 255)
+            win = 7
+            cov_norm = win * win / (win * win - 1)
+            c1 = (0.01 * 255) ** 2
+            c2 = (0.03 * 255) ** 2
+            mu = torch_functional.avg_pool2d(frames, win, stride=1)
+            var = cov_norm * (torch_functional.avg_pool2d(frames * frames, win, stride=1) - mu * mu)
+            ssim_scores = torch.empty((n, n), device=frames.device)
+            for i in range(n):
+                mu_xy = mu[i:i + 1] * mu
+                cov = cov_norm * (torch_functional.avg_pool2d(frames[i:i + 1] * frames, win, stride=1) - mu_xy)
+                numerator = (2 * mu_xy + c1) * (2 * cov + c2)
+                denominator = (mu[i:i + 1] ** 2 + mu ** 2 + c1) * (var[i:i + 1] + var + c2)
+                ssim_scores[i] = (numerator / denominator).mean(dim=(1, 2, 3))
+            
+            scores = torch.maximum(torch.maximum(hist_scores, ncc_scores), ssim_scores)
         
-        return {"x": x, "y": y, "w": w, "h": h}
+        return scores.cpu().numpy()
         
     except Exception as e:
-        print(f"Error converting grid cells '{grid_cells_string}': {e}", file=sys.stderr)
+        print(f"GPU similarity failed, falling back to per-pair comparison: {e}", file=sys.stderr)
+        return None
+
+# AI grid layout: 4 columns x 3 rows, A1-A4 (top), B1-B4 (middle), C1-C4 (bottom)
+GRID_CELL_WIDTH = 1.0 / 4.0
+GRID_CELL_HEIGHT = 1.0 / 3.0
+GRID_ROW_INDEX = {"A": 0, "B": 1, "C": 2}
+GRID_CELL_PATTERN = re.compile(r"\b([ABC])0*([1-4])\b")
+
+def convert_grid_cells_to_bounding_box(grid_cells_string):
+    """
+    Convert grid cell notation (e.g., "A1", "B2-B3", "A1-A2-B1-B2") to normalized bounding box coordinates
+    Grid is 4x3: A1-A4 (top), B1-B4 (middle), C1-C4 (bottom)
+    """
+    if not isinstance(grid_cells_string, str):
+        return {"x": 0.1, "y": 0.1, "w": 0.2, "h": 0.2}  # Default small box
+    
+    # Track the covered rows/columns in a single pass over the matched cells
+    min_row = min_col = 3
+    max_row = max_col = -1
+    for row_letter, col_number in GRID_CELL_PATTERN.findall(grid_cells_string.upper()):
+        row_index = GRID_ROW_INDEX[row_letter]
+        col_index = int(col_number) - 1  # Convert 1-4 to 0-3
+        min_row = min(min_row, row_index)
+        max_row = max(max_row, row_index)
+        min_col = min(min_col, col_index)
+        max_col = max(max_col, col_index)
+    
+    if max_row < 0:
         return {"x": 0.1, "y": 0.1, "w": 0.2, "h": 0.2}
+    
+    # Convert to normalized coordinates (0-1)
+    x = min_col * GRID_CELL_WIDTH
+    y = min_row * GRID_CELL_HEIGHT
+    w = (max_col - min_col + 1) * GRID_CELL_WIDTH
+    h = (max_row - min_row + 1) * GRID_CELL_HEIGHT
+    
+    # Ensure values are within bounds
+    x = max(0.0, min(1.0, x))
+    y = max(0.0, min(1.0, y))
+    w = max(0.05, min(1.0 - x, w))  # Minimum 5% width
+    h = max(0.05, min(1.0 - y, h))  # Minimum 5% height
+    
+    return {"x": x, "y": y, "w": w, "h": h}
+
+# Rank used to keep the most severe box when overlapping boxes are merged
+SEVERITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+BOX_IOU_THRESHOLD = 0.6
+
+# Shared hazard groups for deduplication: AI boxes carry the issue type, detector boxes the
+# safety category, so both are mapped to one vocabulary before comparing. Every critical
+# detector box that isn't a vehicle or waste is flagged as a pathway obstruction
+AI_ISSUE_BOX_GROUPS = {
+    "parking": "vehicle", "vehicle": "vehicle",
+    "waste": "waste", "debris": "waste",
+    "obstruction": "obstruction", "pathway_blocked": "obstruction", "equipment": "obstruction", "hazard": "obstruction"
+}
+DETECTOR_CATEGORY_BOX_GROUPS = {"vehicle": "vehicle", "waste": "waste"}
+
+def deduplicate_bounding_boxes(bounding_boxes, box_types, iou_threshold=BOX_IOU_THRESHOLD):
+    """
+    Drop boxes overlapping a more severe box of the same hazard group (IoU > iou_threshold)
+    box_types runs parallel to bounding_boxes (AI_ISSUE_BOX_GROUPS / DETECTOR_CATEGORY_BOX_GROUPS);
+    kept boxes stay in their original order
+    """
+    if len(bounding_boxes) < 2:
+        return bounding_boxes
+    
+    # Pairwise IoU over a (B, 4) array of x1, y1, x2, y2 in one broadcast
+    coords = np.array([(b['x'], b['y'], b['w'], b['h']) for b in bounding_boxes], dtype=np.float32)
+    coords[:, 2:] += coords[:, :2]
+    areas = (coords[:, 2] - coords[:, 0]) * (coords[:, 3] - coords[:, 1])
+    inter_w = np.clip(np.minimum(coords[:, None, 2], coords[None, :, 2]) - np.maximum(coords[:, None, 0], coords[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(coords[:, None, 3], coords[None, :, 3]) - np.maximum(coords[:, None, 1], coords[None, :, 1]), 0, None)
+    intersection = inter_w * inter_h
+    union = areas[:, None] + areas[None, :] - intersection
+    iou = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+    
+    box_types = np.asarray(box_types, dtype=object)
+    overlaps = (iou > iou_threshold) & (box_types[:, None] == box_types[None, :])
+    
+    # Greedy pass from most to least severe; ties keep the earlier box
+    order = sorted(range(len(bounding_boxes)), key=lambda i: SEVERITY_RANK.get(bounding_boxes[i].get('severity'), len(SEVERITY_RANK)))
+    suppressed = np.zeros(len(bounding_boxes), dtype=bool)
+    for i in order:
+        if not suppressed[i]:
+            suppressed |= overlaps[i]
+            suppressed[i] = False
+    
+    return [box for box, drop in zip(bounding_boxes, suppressed) if not drop]
+
+# Frame-count limits for filter_unique_frames
+MAX_UNIQUE_FRAMES = 12
+MIN_FRAMES_TO_FILTER = 6
+MAX_FRAMES_TO_COMPARE = 60
+PRESAMPLE_FRAME_COUNT = 200
+
+# Similarity threshold the analyzer selects its frames with
+FRAME_SELECTION_THRESHOLD = 0.88
+
+def _sample_unique_frames(unique_frames):
+    """
+    Time-based sampling of the selected frames down to MAX_UNIQUE_FRAMES
+    """
+    if len(unique_frames) > MAX_UNIQUE_FRAMES:  # Increased max frames from 8 to 12
+        step = len(unique_frames) // MAX_UNIQUE_FRAMES
+        sampled_unique = unique_frames[::step][:MAX_UNIQUE_FRAMES]
+        print(f"Additional sampling: {len(unique_frames)} -> {len(sampled_unique)} frames", file=sys.stderr)
+        return sampled_unique
+    return unique_frames
 
 def filter_unique_frames(frame_files, frames_dir, similarity_threshold=0.88):
     """
@@ -772,52 +1313,88 @@ def filter_unique_frames(frame_files, frames_dir, similarity_threshold=0.88):
     if not frame_files:
         return []
     
+    # Fast paths: too few frames to be worth filtering, or a threshold that decides every pair
+    if len(frame_files) <= MIN_FRAMES_TO_FILTER:
+        return list(frame_files)
+    if similarity_threshold >= 1.0:
+        print(f"Similarity threshold {similarity_threshold} keeps every frame - skipping comparison", file=sys.stderr)
+        return _sample_unique_frames(list(frame_files))
+    if similarity_threshold <= 0.0:
+        print(f"Similarity threshold {similarity_threshold} merges every frame - keeping the first", file=sys.stderr)
+        return [frame_files[0]]
+    
+    # Long videos end up time-sampled anyway, so pre-sample before comparing pixels
+    if len(frame_files) > PRESAMPLE_FRAME_COUNT:
+        presample_step = -(-len(frame_files) // MAX_FRAMES_TO_COMPARE)
+        print(f"Pre-sampling: {len(frame_files)} -> {len(frame_files[::presample_step])} frames (step: {presample_step})", file=sys.stderr)
+        frame_files = frame_files[::presample_step]
+    
     print(f"Starting frame filtering with threshold {similarity_threshold}", file=sys.stderr)
     
     # Try intelligent similarity detection first
     try:
         unique_frames = [frame_files[0]]  # Always keep the first frame
-        print(f"Starting with frame: {frame_files[0]}", file=sys.stderr)
+        logger.debug("Starting with frame: %s", frame_files[0])
         
         # Balanced approach: moderate frame gap and recent frame comparison
         min_frame_gap = 1  # Minimum frames to skip between selections (reduced from 2)
         last_selected_index = 0
+        unique_indices = [0]
+        
+        # Decode every frame once and compare all frames at once on the GPU when available
+        frame_paths = [os.path.join(frames_dir, f) for f in frame_files]
+        gray_frames, frame_valid = load_gray_frames(frame_paths)
+        similarity_matrix = compute_similarity_matrix_gpu(gray_frames)
+        
+        # Otherwise hash every frame once; clearly near/far hash distances decide a pair
+        # without pixel comparison, only borderline pairs use the correlation matrix and SSIM
+        if similarity_matrix is None:
+            distance_matrix = hamming_distance_matrix(compute_frame_hashes(gray_frames))
+            correlation_matrix = compute_similarity_matrix(gray_frames)
+            hamming_threshold = max(1, int(round((1.0 - similarity_threshold) * 64)))
+            near_distance = hamming_threshold // 2
+            far_distance = hamming_threshold * 2
         
         for i, current_frame in enumerate(frame_files[1:], 1):
             # Skip frames that are too close to the last selected frame
             if i - last_selected_index < min_frame_gap:
-                print(f"Frame {current_frame} too close to last selected ({i - last_selected_index} gap) - skipping", file=sys.stderr)
+                logger.debug("Frame %s too close to last selected (%d gap) - skipping", current_frame, i - last_selected_index)
                 continue
                 
-            current_path = os.path.join(frames_dir, current_frame)
             is_unique = True
             
             # Only compare with the last 3 unique frames for efficiency and better filtering
-            recent_unique_frames = unique_frames[-3:] if len(unique_frames) > 3 else unique_frames
-            
-            for unique_frame in recent_unique_frames:
-                unique_path = os.path.join(frames_dir, unique_frame)
+            for j in unique_indices[-3:]:
+                if not (frame_valid[i] and frame_valid[j]):
+                    is_similar = False
+                elif similarity_matrix is not None:
+                    is_similar = similarity_matrix[i, j] > similarity_threshold
+                else:
+                    distance = distance_matrix[i, j]
+                    if distance <= near_distance:
+                        is_similar = True
+                    elif distance >= far_distance:
+                        is_similar = False
+                    elif correlation_matrix[i, j] > similarity_threshold:
+                        is_similar = True
+                    else:
+                        is_similar = HAS_SCIKIT_IMAGE and ssim(gray_frames[i], gray_frames[j]) > similarity_threshold
                 
-                if calculate_image_similarity(current_path, unique_path, similarity_threshold):
-                    print(f"Frame {current_frame} is similar to {unique_frame} (threshold {similarity_threshold}) - skipping", file=sys.stderr)
+                if is_similar:
+                    logger.debug("Frame %s is similar to %s (threshold %s) - skipping", current_frame, frame_files[j], similarity_threshold)
                     is_unique = False
                     break
             
             if is_unique:
                 unique_frames.append(current_frame)
+                unique_indices.append(i)
                 last_selected_index = i
-                print(f"Frame {current_frame} is unique - keeping ({len(unique_frames)} total, gap: {i - (last_selected_index - len(unique_frames) + 1)})", file=sys.stderr)
+                logger.debug("Frame %s is unique - keeping (%d total)", current_frame, len(unique_frames))
         
         print(f"Intelligent filtering: {len(frame_files)} -> {len(unique_frames)} frames", file=sys.stderr)
         
         # If we still have too many frames, apply additional time-based sampling
-        if len(unique_frames) > 12:  # Increased max frames from 8 to 12
-            step = len(unique_frames) // 12
-            sampled_unique = unique_frames[::step][:12]
-            print(f"Additional sampling: {len(unique_frames)} -> {len(sampled_unique)} frames", file=sys.stderr)
-            return sampled_unique
-        
-        return unique_frames
+        return _sample_unique_frames(unique_frames)
         
     except Exception as e:
         print(f"Error in similarity detection, using time-based sampling: {e}", file=sys.stderr)
@@ -836,52 +1413,98 @@ def filter_unique_frames(frame_files, frames_dir, similarity_threshold=0.88):
         print(f"Time-based sampling: selected {len(sampled_frames)} frames from {total_frames} total (step: {step})", file=sys.stderr)
         return sampled_frames
 
-def process_frames_in_batches(frames_data, api_key, batch_size=5, frames_dir=None):
+# Concurrent OpenRouter requests per run, kept low to respect rate limits
+OPENROUTER_MAX_CONCURRENCY = 4
+
+def process_frames_in_batches(frames_data, api_key, batch_size=5, frames_dir=None, ensemble=False, detection_batch_size=16, precomputed_detections=None):
     """
     Process frames in batches with YOLO detection integration
+    precomputed_detections maps frame filenames to detections already run upstream
     """
+    precomputed_detections = precomputed_detections or {}
     all_frame_details = []
     all_yolo_detections = []
     total_batches = (len(frames_data) + batch_size - 1) // batch_size
     
     print(f"Processing {len(frames_data)} frames in {total_batches} batches of {batch_size}", file=sys.stderr)
     
-    # Run YOLO detection on all frames first if available
+    def detect_batch(batch_frames):
+        # Run YOLO detection for one detector batch of frames if available
+        if not (HAS_YOLO and frames_dir):
+            return [[] for _ in batch_frames]
+        batch_detections = [precomputed_detections.get(frame_data['filename']) for frame_data in batch_frames]
+        missing = [i for i, detections in enumerate(batch_detections) if detections is None]
+        if missing:
+            # Frames already held in memory go to the detector without a re-decode
+            frame_paths = [
+                batch_frames[i]['image'] if isinstance(batch_frames[i].get('image'), np.ndarray)
+                else os.path.join(frames_dir, batch_frames[i]['filename'])
+                for i in missing
+            ]
+            for i, detections in zip(missing, detect_objects_with_yolo_batch(frame_paths, batch_size=detection_batch_size, ensemble=ensemble)):
+                batch_detections[i] = detections
+        for frame_data, yolo_detections in zip(batch_frames, batch_detections):
+            logger.debug("Detector found %d objects in %s", len(yolo_detections), frame_data['filename'])
+        return batch_detections
+    
     if HAS_YOLO and frames_dir:
-        print("Running object detection on all frames...", file=sys.stderr)
-        for frame_data in frames_data:
-            frame_path = os.path.join(frames_dir, frame_data['filename'])
-            yolo_detections = detect_objects_with_yolo(frame_path)
-            all_yolo_detections.append(yolo_detections)
-            print(f"Detector found {len(yolo_detections)} objects in {frame_data['filename']}", file=sys.stderr)
-    else:
-        # Create empty detections if YOLO not available
-        all_yolo_detections = [[] for _ in frames_data]
-    
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min(start_idx + batch_size, len(frames_data))
-        batch_frames = frames_data[start_idx:end_idx]
-        batch_yolo_detections = all_yolo_detections[start_idx:end_idx]
+        print("Running object detection alongside the AI batches...", file=sys.stderr)
+    
+    # A single detector worker runs full-size detector batches in order in the background,
+    # so inference overlaps the OpenRouter round trips; each AI batch only waits for the
+    # detector batches covering its own frames, then its request is sent while later
+    # batches are still being prepared (at most OPENROUTER_MAX_CONCURRENCY in flight)
+    with ThreadPoolExecutor(max_workers=1) as detector, ThreadPoolExecutor(max_workers=OPENROUTER_MAX_CONCURRENCY) as requester:
+        pending_batches = []
+        pending_detections = [
+            detector.submit(detect_batch, frames_data[chunk_start:chunk_start + detection_batch_size])
+            for chunk_start in range(0, len(frames_data), detection_batch_size)
+        ]
         
-        print(f"Processing batch {batch_num + 1}/{total_batches} ({len(batch_frames)} frames)...", file=sys.stderr)
+        for batch_num in range(total_batches):
+            start_idx = batch_num * batch_size
+            end_idx = min(start_idx + batch_size, len(frames_data))
+            batch_frames = frames_data[start_idx:end_idx]
+            
+            while len(all_yolo_detections) < end_idx:
+                chunk_start = len(all_yolo_detections)
+                try:
+                    all_yolo_detections.extend(pending_detections[chunk_start // detection_batch_size].result())
+                except Exception as e:
+                    print(f"Object detection failed for frames {chunk_start}-{chunk_start + detection_batch_size - 1}: {e}", file=sys.stderr)
+                    all_yolo_detections.extend([] for _ in frames_data[chunk_start:chunk_start + detection_batch_size])
+            batch_yolo_detections = all_yolo_detections[start_idx:end_idx]
+            
+            print(f"Processing batch {batch_num + 1}/{total_batches} ({len(batch_frames)} frames)...", file=sys.stderr)
+            pending_batches.append(requester.submit(analyze_batch_with_openrouter, batch_frames, api_key, batch_num, start_idx, batch_yolo_detections))
         
-        try:
-            batch_results = analyze_batch_with_openrouter(batch_frames, api_key, batch_num, start_idx, batch_yolo_detections)
-            if batch_results.get("success"):
-                batch_frame_details = batch_results.get("analysis", {}).get("frameDetails", [])
-                all_frame_details.extend(batch_frame_details)
-                print(f"Batch {batch_num + 1} completed successfully - {len(batch_frame_details)} frames analyzed", file=sys.stderr)
-            else:
-                print(f"Batch {batch_num + 1} failed: {batch_results.get('error', 'Unknown error')}", file=sys.stderr)
-                # Continue with next batch even if one fails
-                
-        except Exception as e:
-            print(f"Error processing batch {batch_num + 1}: {e}", file=sys.stderr)
-            continue
+        # Collect in batch order so frame details stay sorted regardless of completion order
+        for batch_num, pending_batch in enumerate(pending_batches):
+            try:
+                batch_results = pending_batch.result()
+                if batch_results.get("success"):
+                    batch_frame_details = batch_results.get("analysis", {}).get("frameDetails", [])
+                    all_frame_details.extend(batch_frame_details)
+                    print(f"Batch {batch_num + 1} completed successfully - {len(batch_frame_details)} frames analyzed", file=sys.stderr)
+                else:
+                    print(f"Batch {batch_num + 1} failed: {batch_results.get('error', 'Unknown error')}", file=sys.stderr)
+                    # Continue with next batch even if one fails
+                    
+            except Exception as e:
+                print(f"Error processing batch {batch_num + 1}: {e}", file=sys.stderr)
+                continue
     
     return all_frame_details, all_yolo_detections
 
+def _frame_data_url(frame):
+    """
+    data: URL for a frame's saved JPEG, read and encoded right before its request is built
+    so only the in-flight batches hold base64 payloads in memory
+    """
+    with open(frame["filepath"], "rb") as f:
+        # Base64 output is pure ASCII, which decodes faster than utf-8
+        return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+
 def analyze_batch_with_openrouter(batch_frames, api_key, batch_num, start_frame_idx, yolo_detections=None):
     """
     Analyze a single batch of frames with OpenRouter, enhanced with YOLO detection data
@@ -1005,7 +1628,7 @@ Respond ONLY in strict JSON format:
                 ] + [
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{frame['image_base64']}"}
+                        "image_url": {"url": _frame_data_url(frame)}
                     } for frame in batch_frames
                 ]
             }
@@ -1035,18 +1658,18 @@ Respond ONLY in strict JSON format:
                 "error": f"OpenRouter API error: {response.status_code} - {response.text}"
             }
         
-        result = response.json()
-        ai_analysis = json.loads(result["choices"][0]["message"]["content"])
+        result = json_loads(response.content)
+        ai_analysis = json_loads(result["choices"][0]["message"]["content"])
         
-        # DEBUG: Print the AI analysis to see what we're getting
-        print(f"DEBUG: AI Analysis for batch {batch_num + 1}:", file=sys.stderr)
-        print(f"  Frame details count: {len(ai_analysis.get('frameDetails', []))}", file=sys.stderr)
-        for i, frame_detail in enumerate(ai_analysis.get('frameDetails', [])):
-            safety_issues = frame_detail.get('safetyIssues', [])
-            print(f"  Frame {i}: {len(safety_issues)} safety issues", file=sys.stderr)
-            for j, issue in enumerate(safety_issues):
-                grid_cells = issue.get('gridCells', 'None')
-                print(f"    Issue {j}: type={issue.get('type')}, gridCells='{grid_cells}'", file=sys.stderr)
+        # Log the AI analysis to see what we're getting (skipped entirely unless debug logging is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("AI Analysis for batch %d:", batch_num + 1)
+            logger.debug("  Frame details count: %d", len(ai_analysis.get('frameDetails', [])))
+            for i, frame_detail in enumerate(ai_analysis.get('frameDetails', [])):
+                safety_issues = frame_detail.get('safetyIssues', [])
+                logger.debug("  Frame %d: %d safety issues", i, len(safety_issues))
+                for j, issue in enumerate(safety_issues):
+                    logger.debug("    Issue %d: type=%s, gridCells='%s'", j, issue.get('type'), issue.get('gridCells', 'None'))
         
         return {
             "success": True,
@@ -1059,6 +1682,141 @@ Respond ONLY in strict JSON format:
             "error": f"Batch analysis error: {str(e)}"
         }
 
+def _load_frame_selection(selection_path, frame_fingerprint, similarity_threshold):
+    """
+    Return the cached unique frame list if it was computed for the same frame files
+    Frames are fingerprinted by (filename, mtime, size); any change invalidates the cache
+    """
+    if not selection_path or not os.path.exists(selection_path):
+        return None
+    try:
+        cached = read_json_file(selection_path)
+        if cached.get("frames") == frame_fingerprint and cached.get("similarity_threshold") == similarity_threshold:
+            return cached.get("unique_frame_files") or None
+    except Exception as e:
+        print(f"Failed to read cached frame selection, recomputing: {e}", file=sys.stderr)
+    return None
+
+def _save_frame_selection(selection_path, frame_fingerprint, similarity_threshold, unique_frame_files):
+    """
+    Persist the unique frame list next to the dataset so re-runs can skip similarity filtering
+    """
+    if not selection_path:
+        return
+    try:
+        write_json_file(selection_path, {
+            "similarity_threshold": similarity_threshold,
+            "frames": frame_fingerprint,
+            "unique_frame_files": unique_frame_files
+        })
+    except Exception as e:
+        print(f"Failed to save frame selection: {e}", file=sys.stderr)
+
+# Per-dataset index entries live in <dataset_root>/.index/<safe_name>.json (dot-prefixed so it
+# never collides with a dataset directory); index.json is only a consolidated view rebuilt on request
+DATASET_INDEX_DIRNAME = ".index"
+
+def _migrate_legacy_dataset_index(dataset_root):
+    """
+    One-time split of a legacy index.json into per-dataset entries
+    Only runs while the entry directory doesn't exist; afterwards index.json is derived output
+    """
+    index_dir = os.path.join(dataset_root, DATASET_INDEX_DIRNAME)
+    legacy_path = os.path.join(dataset_root, "index.json")
+    if os.path.isdir(index_dir) or not os.path.exists(legacy_path):
+        return
+    try:
+        legacy_index = read_json_file(legacy_path)
+    except Exception as e:
+        print(f"Could not migrate legacy dataset index {legacy_path}: {e}", file=sys.stderr)
+        return
+    
+    # Stage the entries and rename the directory into place, so concurrent jobs
+    # see either the whole migration or none of it
+    staging_dir = f"{index_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(staging_dir, exist_ok=True)
+    for safe_name, entry in legacy_index.items():
+        write_json_file(os.path.join(staging_dir, f"{safe_name}.json"), entry)
+    try:
+        os.rename(staging_dir, index_dir)
+    except OSError:
+        # Another job migrated first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def write_dataset_index_entry(dataset_root, safe_name, entry):
+    """
+    Write one dataset's index entry as its own file
+    Written to a temp file and renamed so concurrent jobs never see a partial entry
+    """
+    _migrate_legacy_dataset_index(dataset_root)
+    index_dir = os.path.join(dataset_root, DATASET_INDEX_DIRNAME)
+    os.makedirs(index_dir, exist_ok=True)
+    entry_path = os.path.join(index_dir, f"{safe_name}.json")
+    tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write_json_file(tmp_path, entry)
+    os.replace(tmp_path, entry_path)
+
+def load_dataset_index(dataset_root):
+    """
+    Consolidated {safe_name: entry} view of the per-dataset entries
+    Removing a dataset's entry file removes it from the index
+    """
+    _migrate_legacy_dataset_index(dataset_root)
+    index = {}
+    index_dir = os.path.join(dataset_root, DATASET_INDEX_DIRNAME)
+    if os.path.isdir(index_dir):
+        with os.scandir(index_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        index[entry.name[:-len(".json")]] = read_json_file(entry.path)
+                    except Exception as e:
+                        print(f"Skipping unreadable index entry {entry.path}: {e}", file=sys.stderr)
+    return index
+
+def rebuild_dataset_index(dataset_root):
+    """
+    Regenerate the consolidated index.json from the per-dataset entries
+    Run on request (--rebuild-dataset-index) rather than by every job
+    """
+    index_path = os.path.join(dataset_root, "index.json")
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write_json_file(tmp_path, load_dataset_index(dataset_root))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+def _load_frame_data(frames_dir, idx, filename, image=None):
+    """
+    Build the frames_data entry for one frame file
+    The image itself is only read and base64-encoded when its batch is sent (see _frame_data_url)
+    image is the frame's decoded BGR array when the caller already has it in memory
+    Returns None if the frame is missing or empty
+    """
+    filepath = os.path.join(frames_dir, filename)
+    try:
+        image_size = os.path.getsize(filepath)
+        if image_size == 0:
+            raise ValueError("empty file")
+        
+        # Extract timestamp from filename (frame_X_XXmXXs.jpg)
+        parts = filename.replace('.jpg', '').split('_')
+        timestamp = parts[2] if len(parts) > 2 else "00:00"
+        
+        logger.debug("Found unique frame: %s (%d bytes)", filename, image_size)
+        frame_data = {
+            "filename": filename,
+            "filepath": filepath,
+            "timestamp": timestamp,
+            "original_index": idx
+        }
+        if image is not None:
+            frame_data["image"] = image
+        return frame_data
+        
+    except Exception as e:
+        print(f"Failed to load frame {filename}: {e}", file=sys.stderr)
+        return None
+
 def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
     """
     Analyze extracted frames using OpenRouter GPT-4o API
@@ -1067,12 +1825,23 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
         # Dataset caching configuration via optional CLI/env
         dataset_root = os.environ.get('DATASET_ROOT')
         video_path = os.environ.get('VIDEO_PATH')
+        ensemble = False
+        detection_batch_size = 16
+        precomputed_detections = None
+        frame_detector = None
+        frame_images = {}
         if hasattr(analyze_frames_with_openrouter, "_options"):
             opts = getattr(analyze_frames_with_openrouter, "_options")
             if opts.get("dataset_root"):
                 dataset_root = opts["dataset_root"]
             if opts.get("video_path"):
                 video_path = opts["video_path"]
+            ensemble = bool(opts.get("ensemble"))
+            if opts.get("detection_batch_size"):
+                detection_batch_size = max(1, int(opts["detection_batch_size"]))
+            precomputed_detections = opts.get("yolo_detections")
+            frame_detector = opts.get("frame_detector")
+            frame_images = opts.get("frame_images") or {}
 
         # Default dataset root if not provided
         if not dataset_root:
@@ -1094,19 +1863,18 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
             cached_analysis_path = os.path.join(dataset_dir, "analysis.json")
             if os.path.exists(cached_analysis_path):
                 try:
-                    with open(cached_analysis_path, "r", encoding="utf-8") as f:
-                        cached = json.load(f)
+                    cached = read_json_file(cached_analysis_path)
                     print(f"Using cached analysis at {cached_analysis_path}", file=sys.stderr)
                     return cached
                 except Exception as e:
                     print(f"Failed to read cached analysis, recomputing: {e}", file=sys.stderr)
-        # Find all frame files in the directory
-        frame_files = []
-        for file in os.listdir(frames_dir):
-            if file.startswith('frame_') and file.endswith('.jpg'):
-                frame_files.append(file)
-        
-        frame_files.sort()  # Sort by filename to maintain order
+        # Find all frame files in the directory, sorted by filename to maintain order
+        with os.scandir(frames_dir) as entries:
+            frame_entries = sorted(
+                (entry for entry in entries if entry.name.startswith('frame_') and entry.name.endswith('.jpg')),
+                key=lambda entry: entry.name
+            )
+        frame_files = [entry.name for entry in frame_entries]
         
         if not frame_files:
             return {
@@ -1117,43 +1885,35 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
         
         print(f"Found {len(frame_files)} frame files to analyze", file=sys.stderr)
         
-        # Step 1: Filter out similar frames with balanced similarity detection
-        print("Step 1: Filtering out similar frames (balanced mode)...", file=sys.stderr)
-        unique_frame_files = filter_unique_frames(frame_files, frames_dir, similarity_threshold=0.88)
+        # Reuse the frame selection of a previous run when the frame files are unchanged
+        similarity_threshold = FRAME_SELECTION_THRESHOLD
+        selection_path = os.path.join(dataset_dir, "frame_selection.json") if dataset_dir else None
+        frame_fingerprint = []
+        for entry in frame_entries:
+            stat = entry.stat()
+            frame_fingerprint.append([entry.name, stat.st_mtime_ns, stat.st_size])
+        unique_frame_files = _load_frame_selection(selection_path, frame_fingerprint, similarity_threshold)
         
-        # Additional safety check: if we still have too many frames, force more aggressive sampling
-        if len(unique_frame_files) > 15:
-            print(f"Still {len(unique_frame_files)} frames after filtering - applying additional time-based sampling", file=sys.stderr)
-            step = max(2, len(unique_frame_files) // 10)  # Max 10 frames (increased from 6)
-            unique_frame_files = unique_frame_files[::step][:10]
-            print(f"Final frame count after additional sampling: {len(unique_frame_files)}", file=sys.stderr)
+        if unique_frame_files is not None:
+            print(f"Step 1: Reusing cached frame selection ({len(unique_frame_files)} frames) from {selection_path}", file=sys.stderr)
+        else:
+            # Step 1: Filter out similar frames with balanced similarity detection
+            print("Step 1: Filtering out similar frames (balanced mode)...", file=sys.stderr)
+            unique_frame_files = filter_unique_frames(frame_files, frames_dir, similarity_threshold=similarity_threshold)
+            
+            # Additional safety check: if we still have too many frames, force more aggressive sampling
+            if len(unique_frame_files) > 15:
+                print(f"Still {len(unique_frame_files)} frames after filtering - applying additional time-based sampling", file=sys.stderr)
+                step = max(2, len(unique_frame_files) // 10)  # Max 10 frames (increased from 6)
+                unique_frame_files = unique_frame_files[::step][:10]
+                print(f"Final frame count after additional sampling: {len(unique_frame_files)}", file=sys.stderr)
+            
+            _save_frame_selection(selection_path, frame_fingerprint, similarity_threshold, unique_frame_files)
         
         # Step 2: Convert unique frames to base64
         print("Step 2: Loading unique frames...", file=sys.stderr)
-        frames_data = []
-        for idx, filename in enumerate(unique_frame_files):
-            filepath = os.path.join(frames_dir, filename)
-            try:
-                with open(filepath, 'rb') as f:
-                    image_data = f.read()
-                    image_base64 = base64.b64encode(image_data).decode('utf-8')
-                    
-                    # Extract timestamp from filename (frame_X_XXmXXs.jpg)
-                    parts = filename.replace('.jpg', '').split('_')
-                    timestamp = parts[2] if len(parts) > 2 else "00:00"
-                    
-                    frames_data.append({
-                        "filename": filename,
-                        "timestamp": timestamp,
-                        "image_base64": image_base64,
-                        "original_index": idx
-                    })
-                    
-                print(f"Loaded unique frame: {filename} ({len(image_data)} bytes)", file=sys.stderr)
-                    
-            except Exception as e:
-                print(f"Failed to load frame {filename}: {e}", file=sys.stderr)
-                continue
+        loaded_frames = (_load_frame_data(frames_dir, idx, filename, frame_images.get(filename)) for idx, filename in enumerate(unique_frame_files))
+        frames_data = [frame_data for frame_data in loaded_frames if frame_data is not None]
         
         if not frames_data:
             return {
@@ -1163,12 +1923,25 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                 "unique_frames": len(unique_frame_files)
             }
         
+        # A caller-supplied detector (e.g. pinned CPU worker processes) covers the selected frames
+        # up front; it takes frame paths and returns detections keyed by filename
+        if frame_detector is not None and HAS_YOLO:
+            precomputed_detections = dict(precomputed_detections or {})
+            undetected = [frame_data["filepath"] for frame_data in frames_data if frame_data["filename"] not in precomputed_detections]
+            if undetected:
+                print(f"Detecting {len(undetected)} selected frames with the supplied detector...", file=sys.stderr)
+                try:
+                    precomputed_detections.update(frame_detector(undetected))
+                except Exception as e:
+                    # Frames it didn't cover are detected in-process below
+                    print(f"Supplied detector failed, detecting in-process: {e}", file=sys.stderr)
+        
         print(f"Step 3: Processing {len(frames_data)} unique frames in batches with detection integration...", file=sys.stderr)
         
         # Step 3: Process frames in smaller batches for efficiency with YOLO detection
         batch_size = min(3, max(1, len(frames_data) // 2))  # Dynamic batch size based on frame count
         print(f"Using batch size: {batch_size} for {len(frames_data)} frames", file=sys.stderr)
-        all_frame_details, all_yolo_detections = process_frames_in_batches(frames_data, api_key, batch_size=batch_size, frames_dir=frames_dir)
+        all_frame_details, all_yolo_detections = process_frames_in_batches(frames_data, api_key, batch_size=batch_size, frames_dir=frames_dir, ensemble=ensemble, detection_batch_size=detection_batch_size, precomputed_detections=precomputed_detections)
         
         # Step 4: Combine results and determine overall safety status with enhanced bounding boxes
         overall_incorrect_parking = False
@@ -1176,26 +1949,32 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
         all_explanations = []
         processed_frames = []
         comprehensive_mitigations = []
+        # Frame statistics are accumulated in the same pass that builds the frame objects
+        total_ai_issues = 0
+        frames_with_issues = 0
         
         # Create frame objects with enhanced bounding boxes (combining YOLO and AI detections)
-        for frame_idx, frame_detail in enumerate(all_frame_details):
+        frame_position_by_index = {frame_data['original_index']: position for position, frame_data in enumerate(frames_data)}
+        for frame_detail in all_frame_details:
             frame_index = frame_detail.get('frameIndex', 0)
             timestamp = frame_detail.get('timestamp', '00:00')
+            ai_issue_count = len(frame_detail.get("safetyIssues", []))
+            total_ai_issues += ai_issue_count
             
-            # Find corresponding frame data and YOLO detections
+            # Find corresponding frame data and its YOLO detections (aligned with frames_data)
             corresponding_frame = None
             frame_yolo_detections = []
             
-            for frame_data in frames_data:
-                if frame_data['original_index'] == frame_index:
-                    corresponding_frame = frame_data
-                    if frame_idx < len(all_yolo_detections):
-                        frame_yolo_detections = all_yolo_detections[frame_idx]
-                    break
+            frame_position = frame_position_by_index.get(frame_index)
+            if frame_position is not None:
+                corresponding_frame = frames_data[frame_position]
+                if frame_position < len(all_yolo_detections):
+                    frame_yolo_detections = all_yolo_detections[frame_position]
             
             if corresponding_frame:
                 # Create enhanced bounding boxes combining AI grid detection and YOLO precision
                 bounding_boxes = []
+                box_types = []
                 
                 # Process AI-detected safety issues with grid-based locations
                 if frame_detail.get("safetyIssues"):
@@ -1222,6 +2001,8 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                                 "severity": issue.get('severity', 'medium'),
                                 "mitigation": issue.get('mitigationStrategy', 'No specific mitigation provided')
                             })
+                            issue_type = issue.get('type', 'hazard')
+                            box_types.append(AI_ISSUE_BOX_GROUPS.get(issue_type, issue_type))
                             print(f"AI Grid cells '{grid_cells}' -> bbox: x={bbox_coords['x']:.3f}, y={bbox_coords['y']:.3f}, w={bbox_coords['w']:.3f}, h={bbox_coords['h']:.3f}", file=sys.stderr)
                 
                 # Add only CRITICAL detector hazards as precise bounding boxes
@@ -1250,8 +2031,12 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                             "mitigation_summary": f"Remove {yolo_obj['class_name']} from pathway immediately" if severity_info['immediate_action'] else f"Relocate {yolo_obj['class_name']} to designated area"
                         }
                         bounding_boxes.append(hazard_bbox)
+                        box_types.append(DETECTOR_CATEGORY_BOX_GROUPS.get(yolo_obj['safety_category'], "obstruction"))
                         print(f"CRITICAL HAZARD: '{yolo_obj['class_name']}' ({severity_info['severity']}) -> bbox: x={bbox['x']:.3f}, y={bbox['y']:.3f}, w={bbox['w']:.3f}, h={bbox['h']:.3f}", file=sys.stderr)
                 
+                # Merge AI and detector boxes flagging the same hazard
+                bounding_boxes = deduplicate_bounding_boxes(bounding_boxes, box_types)
+                
                 # Create frame object for frontend with enhanced data
                 frame_obj = {
                     "time": timestamp,
@@ -1259,7 +2044,7 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     "filename": corresponding_frame['filename'],
                     "boundingBoxes": bounding_boxes,
                     "yolo_detections": len(frame_yolo_detections),
-                    "ai_issues": len(frame_detail.get("safetyIssues", [])),
+                    "ai_issues": ai_issue_count,
                     "frame_analysis": {
                         "detailed_observations": frame_detail.get('detailedObservations', ''),
                         "pathway_clearance": frame_detail.get('pathwayClearance', ''),
@@ -1268,6 +2053,8 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     }
                 }
                 processed_frames.append(frame_obj)
+                if bounding_boxes:
+                    frames_with_issues += 1
         
         # Generate comprehensive mitigation strategies
         print("Generating comprehensive mitigation strategies...", file=sys.stderr)
@@ -1284,8 +2071,7 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
         
         # Calculate comprehensive statistics
         total_yolo_objects = len(flat_yolo_detections)
-        total_hazardous_objects = len([obj for obj in flat_yolo_detections if obj.get('potential_hazard', False)])
-        total_ai_issues = sum(len(frame_detail.get("safetyIssues", [])) for frame_detail in all_frame_details)
+        total_hazardous_objects = sum(1 for obj in flat_yolo_detections if obj.get('potential_hazard', False))
         
         # Build final result object
         result_obj = {
@@ -1303,7 +2089,7 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     "total_yolo_objects": total_yolo_objects,
                     "total_hazardous_objects": total_hazardous_objects,
                     "total_ai_safety_issues": total_ai_issues,
-                    "frames_with_issues": len([f for f in processed_frames if len(f['boundingBoxes']) > 0])
+                    "frames_with_issues": frames_with_issues
                 }
             },
             "frames_analyzed": len(frames_data),
@@ -1336,6 +2122,11 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                 color_medium = (0, 255, 255)   # Yellow
                 color_low = (255, 255, 0)      # Cyan
 
+                # Collect rectangle and label-background corners per color so each color
+                # is drawn with one polylines and one fillPoly call
+                outlines_by_color = {}
+                backgrounds_by_color = {}
+                labels = []
                 for b in boxes:
                     x = int(b.get('x', 0) * width)
                     y = int(b.get('y', 0) * height)
@@ -1358,8 +2149,8 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     else:
                         color = color_yolo if source == 'yolo_detection' else color_ai
 
-                    # Draw rectangle
-                    cv2.rectangle(img, (x, y), (x2, y2), color, 2)
+                    # Rectangle outline
+                    outlines_by_color.setdefault(color, []).append(((x, y), (x2, y), (x2, y2), (x, y2)))
 
                     # Label text
                     label = b.get('label') or b.get('hazard_type') or 'object'
@@ -1367,10 +2158,18 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     if isinstance(conf, (int, float)):
                         label = f"{label} ({conf:.2f})"
 
-                    # Put label with background
+                    # Label background
                     (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                    cv2.rectangle(img, (x, max(0, y - th - 6)), (x + tw + 6, y), color, -1)
-                    cv2.putText(img, label, (x + 3, y - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+                    top = max(0, y - th - 6)
+                    backgrounds_by_color.setdefault(color, []).append(((x, top), (x + tw + 6, top), (x + tw + 6, y), (x, y)))
+                    labels.append((label, (x + 3, y - 4)))
+
+                for color, outlines in outlines_by_color.items():
+                    cv2.polylines(img, np.array(outlines, dtype=np.int32).reshape(-1, 4, 1, 2), True, color, 2)
+                for color, backgrounds in backgrounds_by_color.items():
+                    cv2.fillPoly(img, np.array(backgrounds, dtype=np.int32).reshape(-1, 4, 1, 2), color)
+                for label, origin in labels:
+                    cv2.putText(img, label, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
 
                 # Save as PNG for quality
                 return cv2.imwrite(dst_path, img)
@@ -1383,8 +2182,7 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
             try:
                 # Save analysis.json
                 analysis_path = os.path.join(dataset_dir, "analysis.json")
-                with open(analysis_path, "w", encoding="utf-8") as f:
-                    json.dump(result_obj, f, ensure_ascii=False)
+                write_json_file(analysis_path, result_obj)
 
                 # Write annotated images into dataset/images
                 images_dir = os.path.join(dataset_dir, "images")
@@ -1395,16 +2193,30 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     fn = pf.get('filename')
                     if fn:
                         filename_to_boxes[fn] = pf.get('boundingBoxes', [])
-                for filename in unique_frame_files:
-                    src = os.path.join(frames_dir, filename)
-                    # Save annotated as PNG to preserve quality
-                    out_name = os.path.splitext(filename)[0] + ".png"
-                    dst = os.path.join(images_dir, out_name)
+                # Directory prefixes built once; per-image paths are plain string concatenation
+                frames_dir_prefix = os.path.join(frames_dir, "")
+                images_dir_prefix = os.path.join(images_dir, "")
+
+                def _write_dataset_image(filename):
+                    # Returns the dataset image name written for this frame, or None
+                    src = frames_dir_prefix + filename
                     boxes = filename_to_boxes.get(filename, [])
-                    ok = _annotate_and_save_image(src, boxes, dst)
-                    if not ok and os.path.exists(src):
-                        # Fallback to copy original
-                        shutil.copy2(src, os.path.join(images_dir, filename))
+                    if boxes:
+                        # Save annotated as PNG to preserve quality
+                        dot = filename.rfind(".")
+                        out_name = (filename[:dot] if dot > 0 else filename) + ".png"
+                        if _annotate_and_save_image(src, boxes, images_dir_prefix + out_name):
+                            return out_name
+                    # Nothing to draw (or annotation failed): copy the original frame as-is
+                    if os.path.exists(src):
+                        shutil.copy2(src, images_dir_prefix + filename)
+                        return filename
+                    return None
+
+                # Decode, drawing and PNG encoding release the GIL, so images are written in parallel
+                with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as writer:
+                    image_files = [name for name in writer.map(_write_dataset_image, unique_frame_files) if name]
+                image_formats = {os.path.splitext(name)[1].lstrip(".").lower() for name in image_files}
 
                 # Save metadata.json
                 metadata = {
@@ -1414,31 +2226,21 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
                     "created_at": datetime.utcnow().isoformat() + "Z",
                     "job_id": job_id,
                     "unique_frame_files": unique_frame_files,
-                    "image_format": "png",
+                    "image_format": image_formats.pop() if len(image_formats) == 1 else "mixed",
+                    "image_files": image_files,
                     "detection_methods": result_obj["detection_methods"],
                     "stats": result_obj["analysis"]["statistics"]
                 }
-                with open(os.path.join(dataset_dir, "metadata.json"), "w", encoding="utf-8") as f:
-                    json.dump(metadata, f, ensure_ascii=False)
+                write_json_file(os.path.join(dataset_dir, "metadata.json"), metadata)
 
-                # Update datasets index
-                index_path = os.path.join(dataset_root, "index.json")
-                index = {}
-                if os.path.exists(index_path):
-                    try:
-                        with open(index_path, "r", encoding="utf-8") as f:
-                            index = json.load(f)
-                    except Exception:
-                        index = {}
-                index[safe_name] = {
+                # Update datasets index: one small file per dataset, no shared read-modify-write
+                write_dataset_index_entry(dataset_root, safe_name, {
                     "video_path": video_path,
                     "dataset_dir": os.path.abspath(dataset_dir),
                     "analysis_path": os.path.abspath(analysis_path),
                     "images_dir": os.path.abspath(images_dir),
                     "updated_at": datetime.utcnow().isoformat() + "Z"
-                }
-                with open(index_path, "w", encoding="utf-8") as f:
-                    json.dump(index, f, ensure_ascii=False)
+                })
                 print(f"Saved dataset to {dataset_dir}", file=sys.stderr)
             except Exception as e:
                 print(f"Failed to persist dataset: {e}", file=sys.stderr)
@@ -1473,12 +2275,25 @@ def analyze_frames_with_openrouter(frames_dir, api_key, job_id):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze frames with OpenRouter and cache dataset")
-    parser.add_argument("frames_directory", help="Directory containing frame_*.jpg files")
-    parser.add_argument("api_key", help="OpenRouter API key")
-    parser.add_argument("job_id", help="Job id for tracking")
+    parser.add_argument("frames_directory", nargs="?", help="Directory containing frame_*.jpg files")
+    parser.add_argument("api_key", nargs="?", help="OpenRouter API key")
+    parser.add_argument("job_id", nargs="?", help="Job id for tracking")
     parser.add_argument("--dataset-root", dest="dataset_root", default=None, help="Root directory to save datasets")
     parser.add_argument("--video-path", dest="video_path", default=None, help="Original video file path (to name dataset)")
+    parser.add_argument("--ensemble", action="store_true", help="Run the nano+small+medium detector ensemble instead of the single medium model")
+    parser.add_argument("--detection-batch-size", dest="detection_batch_size", type=int, default=16, help="Frames per batched YOLO predict call")
+    parser.add_argument("--rebuild-dataset-index", dest="rebuild_dataset_index", action="store_true", help="Regenerate <dataset-root>/index.json from the per-dataset entries and exit")
     args = parser.parse_args()
+    
+    if args.rebuild_dataset_index:
+        index_path = rebuild_dataset_index(args.dataset_root or os.environ.get("DATASET_ROOT") or "datasets")
+        print_json_result({"success": True, "index_path": index_path})
+        sys.exit(0)
+    if args.job_id is None:
+        parser.error("frames_directory, api_key and job_id are required")
+
+    # Diagnostics go to stderr; set LOG_LEVEL=DEBUG for per-frame detail
+    logging.basicConfig(stream=sys.stderr, level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(message)s")
 
     frames_dir = args.frames_directory
     api_key = args.api_key
@@ -1501,8 +2316,10 @@ if __name__ == "__main__":
     # Pass optional settings to the function via attribute to avoid refactor
     setattr(analyze_frames_with_openrouter, "_options", {
         "dataset_root": args.dataset_root,
-        "video_path": args.video_path
+        "video_path": args.video_path,
+        "ensemble": args.ensemble,
+        "detection_batch_size": args.detection_batch_size
     })
 
     result = analyze_frames_with_openrouter(frames_dir, api_key, job_id)
-    print(json.dumps(result))
+    print_json_result(result)
@@ -3,50 +3,99 @@ import base64
 import json
 import sys
 import os
+import shutil
+import hashlib
 import tempfile
+import queue
+import threading
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-# Try to import scikit-image, fallback to basic similarity if not available
+# Try to import PyAV for streaming decode, fallback to OpenCV seeking if not available
 try:
-    from skimage.metrics import structural_similarity as ssim
-    HAS_SCIKIT_IMAGE = True
+    import av
+    HAS_PYAV = True
 except ImportError:
-    print("Warning: scikit-image not available, using basic similarity detection", file=sys.stderr)
-    HAS_SCIKIT_IMAGE = False
+    HAS_PYAV = False
+
+# Try to import orjson for faster JSON encoding/decoding, fallback to the json module if not available
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Run the grayscale/resize/blur/diff chain through OpenCL (cv2.UMat) when a device is available
+USE_OPENCL = cv2.ocl.haveOpenCL()
+if USE_OPENCL:
+    cv2.ocl.setUseOpenCL(True)
+
+# 3x3 opening kernel that removes isolated specks from the motion mask
+MOTION_OPEN_KERNEL = np.ones((3, 3), dtype=np.uint8)
+
+# Working sizes for the motion and similarity checks
+MOTION_SIZE = (320, 240)
+SIMILARITY_SIZE = (160, 120)
+
+# Blur thresholds are Laplacian variance on the 160x120 view. A constant factor can't map them
+# from 640x480 units: full-size variance is dominated by sensor noise, which the 4x downsample
+# averages away. Calibrated on sharp, blurred and noisy frames, 50 rejects frames blurred by
+# sigma >= 4 px at 640x480 and keeps ~97% of sharp ones
+BLUR_THRESHOLD_STRICT = 100
+BLUR_THRESHOLD_RELAXED = 50
+
+# Mean absolute gray difference (0-255) allowed per unit of missing similarity; calibrated so
+# a 0.85 similarity threshold matches frames within ~12 gray levels, the MAD seen at SSIM 0.85
+MAD_PER_SIMILARITY = 80.0
+
+def prepare_frame_features(frame):
+    """
+    Grayscale views of a frame shared by the quality, motion and similarity checks
+    Computed once per sampled frame and kept for the last saved frame
+    With OpenCL the full-size and motion views stay on the device as cv2.UMat
+    """
+    is_color = len(frame.shape) == 3
+    if USE_OPENCL:
+        frame = cv2.UMat(frame)
+    
+    # Convert to grayscale
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if is_color else frame
+    
+    # Resized and blurred (to reduce noise) for motion detection
+    motion_gray = cv2.GaussianBlur(cv2.resize(gray, MOTION_SIZE), (21, 21), 0)
+    
+    # Resized to standard size for faster similarity comparison; the quality check needs it on the host
+    similarity_gray = cv2.resize(gray, SIMILARITY_SIZE)
+    if isinstance(similarity_gray, cv2.UMat):
+        similarity_gray = similarity_gray.get()
+    
+    return {
+        "motion_gray": motion_gray,
+        "similarity_gray": similarity_gray
+    }
 
 def detect_motion(frame1, frame2, threshold=1000):
     """
-    Detect significant motion between two frames
-    Returns motion score (higher = more motion)
+    Detect significant motion between two frames (or their prepare_frame_features results)
+    Returns motion score as the number of changed pixels at 320x240 (higher = more motion)
     """
     try:
         if frame1 is None or frame2 is None:
             return 0
         
-        # Convert to grayscale
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY) if len(frame1.shape) == 3 else frame1
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY) if len(frame2.shape) == 3 else frame2
-        
-        # Resize for faster processing
-        gray1 = cv2.resize(gray1, (320, 240))
-        gray2 = cv2.resize(gray2, (320, 240))
-        
-        # Apply Gaussian blur to reduce noise
-        gray1 = cv2.GaussianBlur(gray1, (21, 21), 0)
-        gray2 = cv2.GaussianBlur(gray2, (21, 21), 0)
+        features1 = frame1 if isinstance(frame1, dict) else prepare_frame_features(frame1)
+        features2 = frame2 if isinstance(frame2, dict) else prepare_frame_features(frame2)
         
         # Calculate absolute difference
-        frame_diff = cv2.absdiff(gray1, gray2)
+        frame_diff = cv2.absdiff(features1["motion_gray"], features2["motion_gray"])
         
         # Threshold the difference
         _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
         
-        # Find contours
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Calculate total motion area
-        motion_area = sum(cv2.contourArea(contour) for contour in contours if cv2.contourArea(contour) > 50)
+        # Drop specks, then count the moving pixels in a single call
+        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, MOTION_OPEN_KERNEL)
+        motion_area = cv2.countNonZero(thresh)
         
         return motion_area
         
@@ -54,21 +103,23 @@ def detect_motion(frame1, frame2, threshold=1000):
         print(f"Motion detection error: {e}", file=sys.stderr)
         return 0
 
-def is_frame_quality_acceptable(frame, brightness_threshold=30, blur_threshold=50):
+def is_frame_quality_acceptable(frame, brightness_threshold=30, blur_threshold=BLUR_THRESHOLD_STRICT):
     """
     Check if frame quality is acceptable for analysis
+    Accepts a frame or its prepare_frame_features result; both checks run on the 160x120 view,
+    so blur_threshold is in 160x120 units (see BLUR_THRESHOLD_STRICT)
     """
     try:
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+        features = frame if isinstance(frame, dict) else prepare_frame_features(frame)
+        gray_small = features["similarity_gray"]
         
         # Check brightness (avoid very dark frames)
-        mean_brightness = np.mean(gray)
+        mean_brightness = cv2.mean(gray_small)[0]
         if mean_brightness < brightness_threshold:
             return False
         
-        # Check blur (using Laplacian variance)
-        blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
+        # Check blur (using Laplacian variance, FP32 on the downsampled view)
+        blur_score = cv2.Laplacian(gray_small, cv2.CV_32F).var()
         if blur_score < blur_threshold:
             return False
         
@@ -78,71 +129,251 @@ def is_frame_quality_acceptable(frame, brightness_threshold=30, blur_threshold=5
         print(f"Quality check error: {e}", file=sys.stderr)
         return True  # Default to accepting frame if check fails
 
+# Similarity methods accepted by extract_frames_with_opencv
+SIMILARITY_METHODS = ("mad", "dhash64")
+
+# int.bit_count (Python 3.10+) is a single POPCNT; older versions count the binary digits
+HAS_INT_BIT_COUNT = hasattr(int, "bit_count")
+
+def dhash64(gray):
+    """
+    64-bit difference hash of a grayscale image
+    9x8 area reduce, one bit per horizontal neighbour comparison
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), "big")
+
 def calculate_frame_similarity(frame1, frame2, threshold=0.85):
     """
-    Enhanced similarity calculation with motion awareness
+    Similarity as mean absolute difference of the 160x120 grays, scaled to the threshold
+    When both feature dicts carry a "dhash", compares the hashes instead: similar when at
+    most (1 - threshold) * 64 bits differ
+    Accepts frames or their prepare_frame_features results
     Returns True if frames are similar (above threshold)
     """
     try:
         if frame1 is None or frame2 is None:
             return False
         
-        # Convert to grayscale for comparison
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY) if len(frame1.shape) == 3 else frame1
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY) if len(frame2.shape) == 3 else frame2
+        features1 = frame1 if isinstance(frame1, dict) else prepare_frame_features(frame1)
+        features2 = frame2 if isinstance(frame2, dict) else prepare_frame_features(frame2)
         
-        # Resize to standard size for faster comparison
-        target_size = (160, 120)
-        gray1_resized = cv2.resize(gray1, target_size)
-        gray2_resized = cv2.resize(gray2, target_size)
+        if "dhash" in features1 and "dhash" in features2:
+            # XOR + popcount over one 64-bit word instead of a pixel scan
+            diff = features1["dhash"] ^ features2["dhash"]
+            differing_bits = diff.bit_count() if HAS_INT_BIT_COUNT else bin(diff).count("1")
+            return differing_bits <= int((1.0 - threshold) * 64)
         
-        similarity_scores = []
+        gray1_resized = features1["similarity_gray"]
+        gray2_resized = features2["similarity_gray"]
         
-        if HAS_SCIKIT_IMAGE:
-            # Use SSIM for structural similarity
-            ssim_score = ssim(gray1_resized, gray2_resized)
-            similarity_scores.append(ssim_score)
+        # Mean absolute difference of the small grays in a single pass
+        mean_abs_diff = cv2.mean(cv2.absdiff(gray1_resized, gray2_resized))[0]
+        return mean_abs_diff < (1.0 - threshold) * MAD_PER_SIMILARITY
         
-        # Use histogram comparison
-        hist1 = cv2.calcHist([gray1_resized], [0], None, [256], [0, 256])
-        hist2 = cv2.calcHist([gray2_resized], [0], None, [256], [0, 256])
-        hist_score = cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL)
-        similarity_scores.append(hist_score)
+    except Exception as e:
+        print(f"Error calculating frame similarity: {e}", file=sys.stderr)
+        return False
+
+def iter_sampled_frames_opencv(cap, fps, duration, frame_interval=1, total_frames=None):
+    """
+    Yield (time, frame) every frame_interval seconds from a sequential OpenCV decode
+    Skipped frames are only grabbed, so no seek rewinds to a keyframe and discarded
+    frames never pay for the YUV->BGR conversion
+    A frame that fails to decode is logged and skipped; only the end of the stream stops the walk
+    """
+    if total_frames is None:
+        total_frames = int(duration * fps)
+    current_time = 0
+    frame_index = 0
+    while current_time < duration:
+        # Calculate frame number for this time
+        target_frame = int(current_time * fps)
         
-        # Use template matching
-        try:
-            result = cv2.matchTemplate(gray1_resized, gray2_resized, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            similarity_scores.append(max_val)
-        except:
-            pass
+        # Advance the decoder without converting the frames in between; a frame that fails
+        # to grab here is never sampled, so it is just passed over
+        while frame_index < target_frame and frame_index < total_frames:
+            cap.grab()
+            frame_index += 1
+        if frame_index >= total_frames:
+            return
         
-        # Use the maximum similarity score
-        if similarity_scores:
-            max_similarity = max(similarity_scores)
-            return max_similarity > threshold
+        # Decode and convert only the sampled frame
+        ret, frame = cap.read()
+        frame_index += 1
+        if ret:
+            yield current_time, frame
+        else:
+            print(f"Could not read frame at {current_time:.1f}s", file=sys.stderr)
         
-        return False
+        # Move to next interval
+        current_time += frame_interval
+
+def iter_sampled_frames_pyav(container, stream, duration, frame_interval=1):
+    """
+    Yield (time, frame) every frame_interval seconds from a single sequential PyAV decode pass
+    Avoids the keyframe rewind that every OpenCV seek triggers
+    """
+    current_time = 0
+    for av_frame in container.decode(stream):
+        if current_time >= duration:
+            break
+        if av_frame.time is None or av_frame.time + 1e-6 < current_time:
+            continue
+        yield current_time, av_frame.to_ndarray(format="bgr24")
         
-    except Exception as e:
-        print(f"Error calculating frame similarity: {e}", file=sys.stderr)
-        return False
+        # Skip sample times this frame already covers (variable frame rate / sparse streams)
+        while current_time <= av_frame.time + 1e-6:
+            current_time += frame_interval
+
+def iter_prefetched(items, maxsize=8):
+    """
+    Run a frame generator on a background thread and yield its items through a bounded queue
+    Decoding releases the GIL, so the next frames decode while the caller analyzes this one
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+    errors = []
+    
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            buffer.put(done)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early, then drain it
+        stop.set()
+        while producer.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    if errors:
+        raise errors[0]
+
+def save_frame_jpeg(filepath, frame, include_base64=False):
+    """
+    Write a frame as JPEG; returns (success, base64 of the written bytes or None)
+    """
+    if not cv2.imwrite(filepath, frame):
+        return False, None
+    if include_base64:
+        # Reuse the JPEG bytes just written instead of encoding the frame again
+        with open(filepath, "rb") as f:
+            return True, base64.b64encode(f.read()).decode("ascii")
+    return True, None
+
+# Sidecar manifest written next to the frames: one JSON object per extracted frame
+MANIFEST_FILENAME = "frames.ndjson"
+
+def json_dumps(obj):
+    """
+    Serialize obj to a compact JSON string, using orjson when available
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+def read_json_file(path):
+    """
+    Load a JSON file, reading raw bytes for orjson
+    """
+    if HAS_ORJSON:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-def extract_frames_with_opencv(video_path, output_dir, frame_interval=1, similarity_threshold=0.70):
+def write_frame_manifest(output_dir, frames):
+    """
+    Write frame metadata as NDJSON (one object per line) and return the manifest path
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        for frame_info in frames:
+            f.write(json_dumps(frame_info))
+            f.write("\n")
+    return manifest_path
+
+def extract_frames_with_opencv(video_path, output_dir, frame_interval=1, similarity_threshold=0.70, include_base64=False, backend=None, return_arrays=False, target_size=(640, 480), similarity_method="mad"):
     """
     Extract frames from video using OpenCV with real-time similarity checking
+    Frames are referenced by filepath; include_base64 also embeds the saved JPEG bytes
+    backend selects the decoder: "pyav", "opencv", or None to use PyAV when installed
+    return_arrays adds "frame_images" ({filename: BGR array}) so callers can skip re-decoding
+    the JPEGs; it holds every saved frame in memory (~0.9MB each at 640x480)
+    target_size (width, height) is applied once right after decode; every check, the saved
+    JPEG and the detector work from that copy (640 wide matches the detector's imgsz)
+    similarity_method: "mad" (mean absolute gray difference) or "dhash64" (64-bit difference hash)
     """
     try:
-        # Open video with OpenCV
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            raise Exception("Could not open video file")
+        if similarity_method not in SIMILARITY_METHODS:
+            raise ValueError(f"Unknown similarity method: {similarity_method}")
+        if backend not in (None, "pyav", "opencv"):
+            raise ValueError(f"Unknown decode backend: {backend}")
+        if backend == "pyav" and not HAS_PYAV:
+            print("PyAV not installed, decoding with OpenCV instead", file=sys.stderr)
+        use_pyav = HAS_PYAV and backend != "opencv"
         
-        # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps if fps > 0 else 0
+        if use_pyav:
+            # Stream-decode with PyAV so each GOP is decoded once
+            try:
+                container = av.open(video_path)
+            except Exception as open_error:
+                raise Exception(f"Could not open video file: {open_error}")
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            
+            # Get video properties
+            fps = float(stream.average_rate or 0)
+            total_frames = stream.frames
+            if stream.duration is not None and stream.time_base is not None:
+                duration = float(stream.duration * stream.time_base)
+            elif container.duration is not None:
+                duration = container.duration / av.time_base
+            else:
+                duration = total_frames / fps if fps > 0 else 0
+            if not total_frames:
+                total_frames = int(duration * fps)
+            
+            sampled_frames = iter_sampled_frames_pyav(container, stream, duration, frame_interval)
+            release_video = container.close
+            method = "pyav_with_similarity"
+        else:
+            # Open video with OpenCV
+            cap = cv2.VideoCapture(video_path)
+            
+            if not cap.isOpened():
+                raise Exception("Could not open video file")
+            
+            # Get video properties
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            duration = total_frames / fps if fps > 0 else 0
+            
+            sampled_frames = iter_sampled_frames_opencv(cap, fps, duration, frame_interval, total_frames)
+            release_video = cap.release
+            method = "opencv_with_similarity"
         
         # Video info logged to stderr to avoid JSON parsing issues
         print(f"Video info: {fps} FPS, {total_frames} total frames, {duration:.2f}s duration", file=sys.stderr)
@@ -150,104 +381,131 @@ def extract_frames_with_opencv(video_path, output_dir, frame_interval=1, similar
         
         extracted_frames = []
         frame_count = 0
-        last_saved_frame = None
+        last_saved_features = None
         skipped_frames = 0
+        similar_count = 0  # Similar frames seen since the last periodic save
         
-        # Extract frames every frame_interval seconds with similarity checking
-        current_time = 0
-        while current_time < duration:
-            # Calculate frame number for this time
-            frame_number = int(current_time * fps)
-            
-            # Set video position to specific frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            
-            # Read frame
-            ret, frame = cap.read()
-            if not ret:
-                print(f"Could not read frame at {current_time:.1f}s", file=sys.stderr)
-                current_time += frame_interval
-                continue
-            
-            # Resize frame to standard size
-            frame = cv2.resize(frame, (640, 480))
-            
-            # Relaxed quality check - only skip extremely poor frames
-            if not is_frame_quality_acceptable(frame, brightness_threshold=15, blur_threshold=25):
-                print(f"Extremely poor quality frame at {current_time:.1f}s - skipping", file=sys.stderr)
-                current_time += frame_interval
-                continue
-            
-            # Intensive analysis mode - more selective but comprehensive
-            should_save = True
-            if last_saved_frame is not None:
-                # Check motion with lower threshold for more sensitivity
-                motion_score = detect_motion(last_saved_frame, frame)
-                motion_threshold = 800  # Lower threshold = more sensitive to motion
+        # Two preallocated target_size buffers: the resized frame is written into the one not holding
+        # the last saved frame, and the roles swap on every save, so the loop allocates no frames
+        target_width, target_height = target_size
+        frame_buffers = (np.empty((target_height, target_width, 3), dtype=np.uint8), np.empty((target_height, target_width, 3), dtype=np.uint8))
+        active_buffer = 0
+        
+        # Three-stage pipeline: a decoder thread feeds sampled frames through a bounded queue,
+        # this thread analyzes them, and a writer thread encodes the saved JPEGs
+        frame_writer = ThreadPoolExecutor(max_workers=1)
+        buffer_writes = [None, None]  # Pending write still reading each frame buffer
+        saved_writes = []
+        prefetched = iter_prefetched(sampled_frames)
+        
+        try:
+            # Extract frames every frame_interval seconds with similarity checking
+            for current_time, frame in prefetched:
+                # The buffer may still be read by its JPEG write; wait for it before reuse
+                if buffer_writes[active_buffer] is not None:
+                    buffer_writes[active_buffer].result()
+                    buffer_writes[active_buffer] = None
                 
-                if motion_score > motion_threshold:
-                    # Motion detected - always save
-                    should_save = True
-                    print(f"Motion detected ({motion_score}), saving frame at {current_time:.1f}s", file=sys.stderr)
-                else:
-                    # Check similarity with stricter threshold (save more frames)
-                    is_similar = calculate_frame_similarity(last_saved_frame, frame, similarity_threshold + 0.05)
-                    if is_similar:
-                        # Even for similar frames, save every 3rd one for comprehensive coverage
-                        if skipped_frames % 3 == 2:  # Save every 3rd similar frame
-                            should_save = True
-                            print(f"Periodic save of similar frame at {current_time:.1f}s for comprehensive analysis", file=sys.stderr)
-                        else:
-                            should_save = False
-                            skipped_frames += 1
-                            print(f"Frame at {current_time:.1f}s is similar - skipping {skipped_frames}/3", file=sys.stderr)
-                    else:
-                        # Different frame - definitely save
+                # Resize frame to standard size; area averaging when shrinking avoids aliasing
+                interpolation = cv2.INTER_AREA if frame.shape[1] > target_width else cv2.INTER_LINEAR
+                frame = cv2.resize(frame, target_size, dst=frame_buffers[active_buffer], interpolation=interpolation)
+                
+                # Grayscale views used by every check below, computed once per frame
+                features = prepare_frame_features(frame)
+                if similarity_method == "dhash64":
+                    features["dhash"] = dhash64(features["similarity_gray"])
+                
+                # Relaxed quality check - only skip extremely poor frames
+                if not is_frame_quality_acceptable(features, brightness_threshold=15, blur_threshold=BLUR_THRESHOLD_RELAXED):
+                    print(f"Extremely poor quality frame at {current_time:.1f}s - skipping", file=sys.stderr)
+                    continue
+                
+                # Intensive analysis mode - more selective but comprehensive
+                should_save = True
+                if last_saved_features is not None:
+                    # Check motion with lower threshold for more sensitivity
+                    motion_score = detect_motion(last_saved_features, features)
+                    motion_threshold = 880  # Changed pixels; lower threshold = more sensitive to motion
+                    
+                    if motion_score > motion_threshold:
+                        # Motion detected - always save
                         should_save = True
-            
-            if should_save:
-                # Create filename
-                minutes = int(current_time // 60)
-                seconds = int(current_time % 60)
-                timestamp = f"{minutes:02d}m{seconds:02d}s"
-                filename = f"frame_{frame_count}_{timestamp}.jpg"
-                filepath = os.path.join(output_dir, filename)
+                        print(f"Motion detected ({motion_score}), saving frame at {current_time:.1f}s", file=sys.stderr)
+                    else:
+                        # Check similarity with stricter threshold (save more frames)
+                        is_similar = calculate_frame_similarity(last_saved_features, features, similarity_threshold + 0.05)
+                        if is_similar:
+                            # Even for similar frames, save every 3rd one for comprehensive coverage
+                            similar_count += 1
+                            if similar_count == 3:  # Save every 3rd similar frame
+                                similar_count = 0
+                                should_save = True
+                                print(f"Periodic save of similar frame at {current_time:.1f}s for comprehensive analysis", file=sys.stderr)
+                            else:
+                                should_save = False
+                                skipped_frames += 1
+                                print(f"Frame at {current_time:.1f}s is similar - skipping {similar_count}/3", file=sys.stderr)
+                        else:
+                            # Different frame - definitely save
+                            should_save = True
                 
-                # Save frame as image
-                success = cv2.imwrite(filepath, frame)
-                if success:
-                    # Convert to base64 for compatibility
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    frame_base64 = base64.b64encode(buffer).decode('utf-8')
+                if should_save:
+                    # Create filename
+                    minutes = int(current_time // 60)
+                    seconds = int(current_time % 60)
+                    timestamp = f"{minutes:02d}m{seconds:02d}s"
+                    filename = f"frame_{frame_count}_{timestamp}.jpg"
+                    filepath = os.path.join(output_dir, filename)
                     
-                    extracted_frames.append({
+                    # Save frame as image on the writer thread; failed writes are dropped below
+                    frame_info = {
                         "time": f"{minutes:02d}:{seconds:02d}",
                         "frame_number": frame_count,
                         "filename": filename,
                         "filepath": filepath,
-                        "image_base64": frame_base64,
                         "imageUrl": f"/temp/{filename}"
-                    })
+                    }
+                    write = frame_writer.submit(save_frame_jpeg, filepath, frame, include_base64)
+                    buffer_writes[active_buffer] = write
+                    # Hand callers a copy; the buffer is reused two frames later
+                    frame_copy = frame.copy() if return_arrays else None
+                    saved_writes.append((current_time, frame_info, write, frame_copy))
                     
-                    # Update last saved frame for next comparison
-                    last_saved_frame = frame.copy()
+                    # Keep the saved frame's grayscale views for the next comparisons
+                    last_saved_features = features
+                    active_buffer ^= 1
                     
                     print(f"Extracted unique frame {frame_count + 1}: {filename} at {minutes:02d}:{seconds:02d}", file=sys.stderr)
                     frame_count += 1
-                else:
-                    print(f"Failed to save frame at {current_time:.1f}s", file=sys.stderr)
-            
-            # Move to next interval
-            current_time += frame_interval
+        finally:
+            # Clean up even if the loop fails: stop the decoder thread, let pending writes
+            # finish, then release the video
+            prefetched.close()
+            frame_writer.shutdown(wait=True)
+            release_video()
         
-        # Clean up
-        cap.release()
+        frame_images = {}
+        for current_time, frame_info, write, frame_copy in saved_writes:
+            success, frame_base64 = write.result()
+            if not success:
+                print(f"Failed to save frame at {current_time:.1f}s", file=sys.stderr)
+                frame_count -= 1
+                continue
+            if frame_base64 is not None:
+                frame_info["image_base64"] = frame_base64
+            if return_arrays:
+                frame_images[frame_info["filename"]] = frame_copy
+            extracted_frames.append(frame_info)
         
         print(f"Extraction complete: {frame_count} unique frames saved, {skipped_frames} similar frames skipped", file=sys.stderr)
         
-        return {
+        manifest_path = write_frame_manifest(output_dir, extracted_frames)
+        
+        result = {
             "success": True,
             "frames": extracted_frames,
+            "manifest": manifest_path,
+            "count": frame_count,
             "total_frames_extracted": frame_count,
             "frames_skipped": skipped_frames,
             "similarity_threshold": similarity_threshold,
@@ -256,9 +514,12 @@ def extract_frames_with_opencv(video_path, output_dir, frame_interval=1, similar
                 "fps": fps,
                 "total_frames": total_frames,
                 "frame_interval": frame_interval,
-                "method": "opencv_with_similarity"
+                "method": method
             }
         }
+        if return_arrays:
+            result["frame_images"] = frame_images
+        return result
         
     except Exception as e:
         return {
@@ -267,17 +528,131 @@ def extract_frames_with_opencv(video_path, output_dir, frame_interval=1, similar
             "frames": []
         }
 
+# On-disk cache of extraction results keyed by video content and extraction settings
+# Frames are staged and cached under FRAME_TMPDIR when set; point it at tmpfs (/dev/shm) or
+# NVMe to keep the frame writes and Step 2 re-reads off slow disks. Not the default, since
+# container /dev/shm is often only 64MB
+FRAME_TMPDIR = os.environ.get("FRAME_TMPDIR")
+FRAME_CACHE_DIR = os.environ.get("FRAME_CACHE_DIR") or os.path.join(FRAME_TMPDIR or os.path.join(Path.home(), ".cache"), "warehouse", "frames")
+FRAME_CACHE_MAX_BYTES = int(os.environ.get("FRAME_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+CACHE_RESULT_FILENAME = "result.json"
+
+def extraction_cache_key(video_path, frame_interval, similarity_threshold, target_size=(640, 480), similarity_method="mad", backend=None):
+    """
+    SHA1 of the video's first MiB and size plus the extraction settings
+    backend is keyed as the decoder actually used, since OpenCV and PyAV sample different frames
+    """
+    decoder = "pyav" if HAS_PYAV and backend != "opencv" else "opencv"
+    digest = hashlib.sha1()
+    with open(video_path, "rb") as f:
+        digest.update(f.read(1 << 20))
+    digest.update(f"{os.path.getsize(video_path)}:{frame_interval}:{similarity_threshold}:{decoder}".encode())
+    if tuple(target_size) != (640, 480):
+        digest.update(f":{target_size[0]}x{target_size[1]}".encode())
+    if similarity_method != "mad":
+        digest.update(f":{similarity_method}".encode())
+    return digest.hexdigest()
+
+def prune_frame_cache(cache_dir, max_bytes, keep=None):
+    """
+    Delete least recently used cache entries until the cache fits in max_bytes
+    Recency is the result file's mtime, refreshed on every hit
+    """
+    entries = []
+    total_bytes = 0
+    with os.scandir(cache_dir) as cache_entries:
+        for entry in cache_entries:
+            if not entry.is_dir():
+                continue
+            # One listing per entry yields both its size and the result file's mtime
+            size = 0
+            last_used = None
+            with os.scandir(entry.path) as files:
+                for f in files:
+                    if not f.is_file():
+                        continue
+                    stat = f.stat()
+                    size += stat.st_size
+                    if f.name == CACHE_RESULT_FILENAME:
+                        last_used = stat.st_mtime
+            if last_used is None:
+                continue
+            entries.append((last_used, entry.path, size))
+            total_bytes += size
+    
+    for _, path, size in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes -= size
+
+def extract_frames_cached(video_path, frame_interval=1, similarity_threshold=0.70, backend=None, cache_dir=None, max_bytes=None, return_arrays=False, target_size=(640, 480), similarity_method="mad"):
+    """
+    extract_frames_with_opencv through an LRU cache of frame directories
+    Returns the extraction result with "output_dir" and "cache_hit" added
+    return_arrays only takes effect on a cache miss, while frames are being extracted
+    """
+    cache_dir = cache_dir or FRAME_CACHE_DIR
+    max_bytes = FRAME_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    key = extraction_cache_key(video_path, frame_interval, similarity_threshold, target_size, similarity_method, backend)
+    entry_dir = os.path.join(cache_dir, key)
+    result_path = os.path.join(entry_dir, CACHE_RESULT_FILENAME)
+    if os.path.exists(result_path):
+        result = read_json_file(result_path)
+        os.utime(result_path)
+        print(f"Using cached frames from {entry_dir}", file=sys.stderr)
+        return {**result, "output_dir": entry_dir, "cache_hit": True}
+    
+    # Extract into a private staging directory, then publish it with an atomic rename
+    staging_dir = tempfile.mkdtemp(prefix=f"{key}.", dir=cache_dir)
+    result = extract_frames_with_opencv(video_path, staging_dir, frame_interval=frame_interval, similarity_threshold=similarity_threshold, backend=backend, return_arrays=return_arrays, target_size=target_size, similarity_method=similarity_method)
+    if not result.get("success"):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return {**result, "output_dir": None, "cache_hit": False}
+    
+    # Point the frame paths at the published location before it exists
+    for frame_info in result["frames"]:
+        frame_info["filepath"] = os.path.join(entry_dir, frame_info["filename"])
+    write_frame_manifest(staging_dir, result["frames"])
+    result["manifest"] = os.path.join(entry_dir, MANIFEST_FILENAME)
+    frame_images = result.pop("frame_images", None)
+    with open(os.path.join(staging_dir, CACHE_RESULT_FILENAME), "w", encoding="utf-8") as f:
+        f.write(json_dumps(result))
+    
+    try:
+        os.rename(staging_dir, entry_dir)
+    except OSError:
+        # Another run published the same entry first; use theirs
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    prune_frame_cache(cache_dir, max_bytes, keep=entry_dir)
+    if frame_images is not None:
+        result["frame_images"] = frame_images
+    return {**result, "output_dir": entry_dir, "cache_hit": False}
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print(json.dumps({"success": False, "error": "Usage: python extract_frames_opencv.py <video_file_path> <output_directory> [similarity_threshold]"}))
+    # Base64 frame payloads are off by default (--no-base64); --base64 embeds them in the JSON
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) < 2:
+        print(json.dumps({"success": False, "error": "Usage: python extract_frames_opencv.py <video_file_path> <output_directory> [similarity_threshold] [--base64|--no-base64]"}))
         sys.exit(1)
     
-    video_path = sys.argv[1]
-    output_dir = sys.argv[2]
-    similarity_threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.70
+    video_path = args[0]
+    output_dir = args[1]
+    similarity_threshold = float(args[2]) if len(args) > 2 else 0.70
+    include_base64 = "--base64" in flags and "--no-base64" not in flags
     
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
     
-    result = extract_frames_with_opencv(video_path, output_dir, similarity_threshold=similarity_threshold)
-    print(json.dumps(result))
+    result = extract_frames_with_opencv(video_path, output_dir, similarity_threshold=similarity_threshold, include_base64=include_base64)
+    
+    # The frame list lives in the manifest file; keep it out of the stdout JSON
+    if result.get("manifest"):
+        result.pop("frames", None)
+    print(json_dumps(result))